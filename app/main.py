@@ -1,13 +1,26 @@
+import atexit
 import logging
 import os
 import secrets
+import tempfile
 from fastapi import FastAPI
-from app.routers import auth_router, calories_router
+from app.routers import auth_router, calories_router, debug_router, dishes_router, meals_router, metrics_router
 from app.config import settings
-from app.services.calories_service import USDAClient
-from app.utils.cache import InMemoryCache
-from app.db import engine, Base
+from app.services.calories_service import USDAClient, USDAScheduler, CaloriesService
+from app.services.auth_service import AuthService
+from app.services import warm_start
+from app.services.meal_log import MealLogWriter
+from app.utils.cache import InMemoryCache, RecordCache
+from app.utils.shm_cache import SharedMemoryCache
+from app.utils.metrics import registry
+from app.utils.profiling import ProfileStore, ProfilingMiddleware
+from app.utils.request_context import RequestContextMiddleware, RequestIdFilter
+from app.utils.log_pipeline import JsonFormatter, setup_logging
+from app.db import engine, Base, AsyncSessionLocal
+from app.repositories.food_repo import FoodRepository
+from sqlalchemy.exc import SQLAlchemyError
 import asyncio
+from logging.handlers import RotatingFileHandler
 from redis import asyncio as aioredis
 
 
@@ -16,24 +29,62 @@
 
 logger = logging.getLogger("meal_calorie_app")
 logger.setLevel(logging.INFO)
-fmt = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
-
-ch = logging.StreamHandler()
-ch.setFormatter(fmt)
-logger.addHandler(ch)
+if settings.LOG_JSON:
+    fmt = JsonFormatter()
+else:
+    fmt = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - [%(request_id)s] %(message)s')
 
+handlers = [logging.StreamHandler()]
+file_handler_error = None
 try:
-    from logging.handlers import RotatingFileHandler
-    fh = RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3)
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+    # rotation renames files, so it runs on the log thread rather than the event loop
+    handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3))
 except Exception as e:
-    logger.warning("Could not create file handler for logging: %s", e)
+    file_handler_error = e
+
+log_pipeline = setup_logging(
+    logger,
+    handlers,
+    fmt,
+    filters=[RequestIdFilter()],
+    queue_size=settings.LOG_QUEUE_SIZE,
+    sample_burst=settings.LOG_SAMPLE_BURST,
+    sample_interval=settings.LOG_SAMPLE_INTERVAL,
+)
+# flush what is queued when the process exits
+atexit.register(log_pipeline.stop)
+if file_handler_error is not None:
+    logger.warning("Could not create file handler for logging: %s", file_handler_error)
+
+async def load_catalog_suggestions(limit: int):
+    """Seed the suggestion index with local catalog names (popularity 0)."""
+    try:
+        async with AsyncSessionLocal() as session:
+            rows = await FoodRepository(session).names(limit)
+    except SQLAlchemyError as e:
+        logger.warning("Could not load catalog names for suggestions: %s", e)
+        return
+    for name_key, description in rows:
+        CaloriesService.suggestions.add(name_key, description, count=0)
+    logger.info("Loaded %d catalog names into the suggestion index", len(rows))
 
 def create_app():
     app = FastAPI(title="Meal Calorie Count")
     app.include_router(auth_router.router)
     app.include_router(calories_router.router)
+    app.include_router(meals_router.router)
+    app.include_router(dishes_router.router)
+    app.include_router(metrics_router.router)
+    profile_store = None
+    if settings.PROFILING_ENABLED:
+        # added before RequestContextMiddleware so it runs inside it and sees the request ID
+        profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
+        debug_router.profile_store = profile_store
+        app.include_router(debug_router.router)
+        app.add_middleware(
+            ProfilingMiddleware, store=profile_store, token=settings.PROFILING_TOKEN, sample_rate=settings.PROFILING_SAMPLE_RATE
+        )
+    app.add_middleware(RequestContextMiddleware)
 
     @app.on_event("startup")
     async def startup():
@@ -61,23 +112,108 @@ async def startup():
                 logger.info("Connected to Redis at %s", settings.REDIS_URL)
             except Exception as e:
                 logger.warning("Could not connect to Redis, falling back to in-memory cache: %s", e)
-                cache = InMemoryCache()
         else:
-            cache = InMemoryCache()
             logger.info("Using in-memory cache (REDIS_URL not provided).")
+        if cache is None and settings.CACHE_BACKEND == "shared":
+            path = settings.SHARED_CACHE_PATH or os.path.join(
+                "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "meal_calorie_cache"
+            )
+            try:
+                cache = SharedMemoryCache(path, slots=settings.SHARED_CACHE_SLOTS, slot_size=settings.SHARED_CACHE_SLOT_SIZE)
+                logger.info("Using shared-memory cache at %s", path)
+            except (OSError, RuntimeError, ValueError) as e:
+                logger.warning("Could not open shared-memory cache, falling back to in-memory cache: %s", e)
+        if cache is None:
+            cache = InMemoryCache(
+                max_entries=settings.MEMORY_CACHE_MAX_ENTRIES,
+                max_bytes=settings.MEMORY_CACHE_MAX_BYTES or None,
+                shards=settings.MEMORY_CACHE_SHARDS,
+            )
+            cache.start()
 
-        usda = USDAClient(settings.USDA_API_KEY)
+        client = USDAClient(settings.USDA_API_KEY)
+        usda = client
+        if settings.USDA_HOURLY_QUOTA:
+            usda = USDAScheduler(
+                client,
+                cache,
+                quota=settings.USDA_HOURLY_QUOTA,
+                max_wait=settings.USDA_QUOTA_WAIT,
+                max_waiting=settings.USDA_QUOTA_MAX_WAITING,
+                batch_window=settings.USDA_BATCH_WINDOW,
+                known_foods=settings.USDA_KNOWN_FOODS,
+            )
         import app.routers.calories_router as cr
         import app.routers.auth_router as ar
         cr.usda_client = usda
         cr.cache_client = cache
+        cr.record_cache = RecordCache(
+            cache,
+            l1_size=settings.L1_CACHE_SIZE,
+            l1_ttl=settings.L1_CACHE_TTL,
+            ttl=settings.CALORIE_CACHE_TTL,
+            negative_ttl=settings.CALORIE_NEGATIVE_TTL,
+            hard_ttl=settings.CALORIE_HARD_TTL,
+            stale_ttl=settings.CALORIE_STALE_TTL,
+        )
+        cr.meal_log = MealLogWriter(
+            settings.MEAL_LOG_BATCH_SIZE, settings.MEAL_LOG_FLUSH_INTERVAL, settings.MEAL_LOG_MAX_PENDING,
+            max_attempts=settings.MEAL_LOG_MAX_ATTEMPTS,
+        )
+        cr.meal_log.start()
         ar.cache_client = cache
         app.state.cache = cache
         app.state.usda = usda
+        app.state.flight = CaloriesService.flight
+        app.state.hasher = AuthService.hasher
+        app.state.refresher = CaloriesService.refresher
+        registry.stats_gauge("meal_cache", "Shared cache backend stats", cache.stats if hasattr(cache, "stats") else dict)
+        registry.stats_gauge("meal_usda_client", "USDA client retry/hedge/breaker stats", client.stats)
+        if usda is not client:
+            registry.stats_gauge("meal_usda_quota", "USDA API quota scheduler stats", usda.stats)
+        registry.stats_gauge("meal_singleflight", "Single-flight coalescing stats", CaloriesService.flight.stats)
+        registry.stats_gauge("meal_password_hasher", "bcrypt pool stats", AuthService.hasher.stats)
+        registry.stats_gauge("meal_refresher", "Background refresh stats", CaloriesService.refresher.stats)
+        registry.stats_gauge("meal_logging", "Log queue stats", log_pipeline.stats)
+        registry.stats_gauge("meal_log_writer", "Write-behind meal log stats", cr.meal_log.stats)
+        registry.stats_gauge("meal_suggest_index", "Dish suggestion index size", CaloriesService.suggestions.stats)
+        if CaloriesService.admission is not None:
+            registry.stats_gauge("meal_admission_calories", "Calorie lookup admission control", CaloriesService.admission.stats)
+        if AuthService.admission is not None:
+            registry.stats_gauge("meal_admission_auth", "Auth admission control", AuthService.admission.stats)
+        if profile_store is not None:
+            registry.stats_gauge("meal_profiling", "Request profiling stats", profile_store.stats)
+
+        # preload the cache in the background so startup isn't held up
+        app.state.warmup = None
+        app.state.suggest_loader = None
+        if settings.LOCAL_FOOD_INDEX and settings.SUGGEST_CATALOG_LIMIT:
+            app.state.suggest_loader = asyncio.create_task(load_catalog_suggestions(settings.SUGGEST_CATALOG_LIMIT))
+        snapshot = warm_start.load_snapshot(settings.WARM_SNAPSHOT_PATH) if settings.WARM_SNAPSHOT_PATH else []
+        seeds = warm_start.load_seed_list(settings.WARM_SEED_FILE) if settings.WARM_SEED_FILE else []
+        if snapshot or seeds:
+            app.state.warmup = asyncio.create_task(
+                warm_start.warm(usda, cache, cr.record_cache, snapshot, seeds, settings.WARM_RATE)
+            )
 
     @app.on_event("shutdown")
     async def shutdown():
         import app.routers.calories_router as cr
+        AuthService.hasher.shutdown()
+        for name in ('warmup', 'suggest_loader'):
+            task = getattr(app.state, name, None)
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        await CaloriesService.refresher.close()
+        if getattr(cr, 'meal_log', None):
+            await cr.meal_log.close()
+        if settings.WARM_SNAPSHOT_PATH and getattr(cr, 'record_cache', None):
+            try:
+                saved = await warm_start.save_snapshot(settings.WARM_SNAPSHOT_PATH, cr.record_cache, settings.WARM_SNAPSHOT_SIZE)
+                logger.info("Saved %d hot dishes to %s", saved, settings.WARM_SNAPSHOT_PATH)
+            except Exception as e:
+                logger.warning("Could not write cache snapshot: %s", e)
         if getattr(cr, 'usda_client', None):
             await cr.usda_client.close()
         if getattr(app.state, 'cache', None) and hasattr(app.state.cache, 'close'):
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from app.db import Base
+from app.services.nutrition import FoodRecord
+
+class Food(Base):
+    __tablename__ = "foods"
+    fdc_id = Column(Integer, primary_key=True)
+    description = Column(String(512), nullable=False)
+    name_key = Column(String(512), nullable=False, index=True)
+    data_type = Column(String(64), nullable=True)
+    calories_per_serving = Column(Float, nullable=True)
+    energy = Column(Float, nullable=True)
+    serving_size = Column(Float, nullable=True)
+    serving_size_unit = Column(String(32), nullable=True)
+    gram_weight = Column(Float, nullable=True)
+    protein = Column(Float, nullable=True)
+    fat = Column(Float, nullable=True)
+    carbohydrate = Column(Float, nullable=True)
+    publication_date = Column(String(32), nullable=True)
+    row_hash = Column(String(32), nullable=False)
+
+    def to_record(self) -> FoodRecord:
+        return FoodRecord(
+            fdc_id=self.fdc_id,
+            name=self.description,
+            data_type=self.data_type or "",
+            energy=self.energy,
+            serving_size=self.serving_size,
+            serving_size_unit=self.serving_size_unit,
+            gram_weight=self.gram_weight,
+            protein=self.protein,
+            fat=self.fat,
+            carbohydrate=self.carbohydrate,
+            source="USDA FoodData Central (local index)",
+        )
+
+
+class FoodToken(Base):
+    """One row per distinct word of a food's name_key, so word matches are index range scans."""
+    __tablename__ = "food_tokens"
+    token = Column(String(128), primary_key=True)
+    fdc_id = Column(Integer, ForeignKey("foods.fdc_id"), primary_key=True, index=True)
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index
+from app.db import Base
+
+
+class MealEntry(Base):
+    __tablename__ = "meal_entries"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    dish_name = Column(String(255), nullable=False)
+    fdc_id = Column(Integer, nullable=True)
+    servings = Column(Float, nullable=False)
+    calories = Column(Float, nullable=False)
+    protein_g = Column(Float, nullable=True)
+    fat_g = Column(Float, nullable=True)
+    carbohydrate_g = Column(Float, nullable=True)
+    logged_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (Index("ix_meal_entries_user_logged_at", "user_id", "logged_at"),)
+
+
+class MealDailyTotal(Base):
+    """Per-user, per-day (UTC) sums, updated as entries are written."""
+    __tablename__ = "meal_daily_totals"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    entries = Column(Integer, nullable=False, default=0)
+    calories = Column(Float, nullable=False, default=0.0)
+    protein_g = Column(Float, nullable=False, default=0.0)
+    fat_g = Column(Float, nullable=False, default=0.0)
+    carbohydrate_g = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,83 @@
+import re
+from sqlalchemy import select, update, insert, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.food import Food, FoodToken
+
+class FoodRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def search(self, name_key: str, limit: int = 25):
+        """Exact name, then prefix, then all-tokens match against the local index."""
+        base = select(Food).where(Food.calories_per_serving.isnot(None))
+        r = await self.session.execute(base.where(Food.name_key == name_key).limit(limit))
+        rows = r.scalars().all()
+        if rows:
+            return rows
+
+        # a range rather than LIKE 'q%' so the name_key index is used on every backend
+        r = await self.session.execute(
+            base.where(Food.name_key >= name_key, Food.name_key < name_key + "\uffff").limit(limit)
+        )
+        rows = r.scalars().all()
+        if rows:
+            return rows
+
+        # the longest words are the most selective
+        tokens = sorted((t for t in name_tokens(name_key) if len(t) > 1), key=len, reverse=True)[:4]
+        if not tokens:
+            return []
+        # every query word must prefix some word of the name
+        clauses = [
+            Food.fdc_id.in_(select(FoodToken.fdc_id).where(FoodToken.token >= t, FoodToken.token < t + "\uffff"))
+            for t in tokens
+        ]
+        r = await self.session.execute(base.where(*clauses).limit(limit))
+        return r.scalars().all()
+
+    async def names(self, limit: int):
+        """(name_key, description) pairs of foods that have calorie data."""
+        r = await self.session.execute(
+            select(Food.name_key, Food.description).where(Food.calories_per_serving.isnot(None)).limit(limit)
+        )
+        return r.all()
+
+    async def get_hashes(self, fdc_ids):
+        r = await self.session.execute(
+            select(Food.fdc_id, Food.row_hash).where(Food.fdc_id.in_(fdc_ids))
+        )
+        return dict(r.all())
+
+    async def sync_batch(self, rows: list[dict]):
+        """Insert new rows and update changed ones; rows whose hash is unchanged are skipped.
+
+        Word tokens are rewritten for new and changed rows, and added for unchanged rows that have
+        none yet (ingested before the token table existed).
+        """
+        existing = await self.get_hashes([row["fdc_id"] for row in rows])
+        new_rows = [row for row in rows if row["fdc_id"] not in existing]
+        changed = [row for row in rows if row["fdc_id"] in existing and existing[row["fdc_id"]] != row["row_hash"]]
+        unchanged = [row for row in rows if existing.get(row["fdc_id"]) == row["row_hash"]]
+
+        if new_rows:
+            self.session.add_all([Food(**row) for row in new_rows])
+        if changed:
+            # ORM bulk UPDATE by primary key, one executemany for the batch
+            await self.session.execute(update(Food), changed)
+            await self.session.execute(delete(FoodToken).where(FoodToken.fdc_id.in_([row["fdc_id"] for row in changed])))
+        tokenize = new_rows + changed
+        if unchanged:
+            r = await self.session.execute(
+                select(FoodToken.fdc_id).where(FoodToken.fdc_id.in_([row["fdc_id"] for row in unchanged])).distinct()
+            )
+            indexed = set(r.scalars().all())
+            tokenize += [row for row in unchanged if row["fdc_id"] not in indexed]
+        tokens = [{"token": t, "fdc_id": row["fdc_id"]} for row in tokenize for t in name_tokens(row["name_key"])]
+        if tokens:
+            await self.session.execute(insert(FoodToken), tokens)
+        await self.session.commit()
+        return len(new_rows), len(changed), len(unchanged)
+
+
+def name_tokens(name_key: str) -> set[str]:
+    return {t[:128] for t in re.findall(r"\w+", name_key)}
@@ -0,0 +1,70 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.meal import MealDailyTotal, MealEntry
+
+_TOTALS = ("entries", "calories", "protein_g", "fat_g", "carbohydrate_g")
+
+
+class MealRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add_entries(self, rows: list[dict]):
+        """Insert entries in one multi-row INSERT and fold them into the daily totals, in one transaction."""
+        if not rows:
+            return
+        await self.session.execute(insert(MealEntry), rows)
+        await self._add_to_totals(_rollup(rows))
+        await self.session.commit()
+
+    async def _add_to_totals(self, totals: list[dict]):
+        dialect = self.session.bind.dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            stmt = upsert(MealDailyTotal)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[MealDailyTotal.user_id, MealDailyTotal.day],
+                set_={c: getattr(MealDailyTotal, c) + getattr(stmt.excluded, c) for c in _TOTALS},
+            )
+            await self.session.execute(stmt, totals)
+            return
+        if dialect in ("mysql", "mariadb"):
+            from sqlalchemy.dialects.mysql import insert as upsert
+            stmt = upsert(MealDailyTotal)
+            stmt = stmt.on_duplicate_key_update({c: getattr(MealDailyTotal, c) + stmt.inserted[c] for c in _TOTALS})
+            await self.session.execute(stmt, totals)
+            return
+        # generic fallback: update existing days, insert the rest
+        for t in totals:
+            r = await self.session.execute(
+                update(MealDailyTotal)
+                .where(MealDailyTotal.user_id == t["user_id"], MealDailyTotal.day == t["day"])
+                .values({c: getattr(MealDailyTotal, c) + t[c] for c in _TOTALS})
+            )
+            if r.rowcount == 0:
+                self.session.add(MealDailyTotal(**t))
+
+    async def daily_totals(self, user_id: int, start, end):
+        r = await self.session.execute(
+            select(MealDailyTotal)
+            .where(MealDailyTotal.user_id == user_id, MealDailyTotal.day >= start, MealDailyTotal.day <= end)
+            .order_by(MealDailyTotal.day)
+        )
+        return r.scalars().all()
+
+
+def _rollup(rows: list[dict]) -> list[dict]:
+    totals = {}
+    for row in rows:
+        key = (row["user_id"], row["logged_at"].date())
+        t = totals.get(key)
+        if t is None:
+            t = totals[key] = {"user_id": key[0], "day": key[1], **{c: 0 for c in _TOTALS}}
+        t["entries"] += 1
+        t["calories"] += row["calories"]
+        for c in ("protein_g", "fat_g", "carbohydrate_g"):
+            t[c] += row.get(c) or 0.0
+    return list(totals.values())
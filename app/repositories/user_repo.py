@@ -11,9 +11,17 @@ async def get_by_email(self, email: str):
         r = await self.session.execute(q)
         return r.scalars().first()
 
+    async def get_by_id(self, user_id: int):
+        return await self.session.get(User, user_id)
+
     async def create_user(self, first_name, last_name, email, hashed_password):
         user = User(first_name=first_name, last_name=last_name, email=email, hashed_password=hashed_password)
         self.session.add(user)
         await self.session.commit()
         await self.session.refresh(user)
         return user
+
+    async def update_password(self, user: User, hashed_password: str):
+        user.hashed_password = hashed_password
+        await self.session.commit()
+        return user
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+import math
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from app.schemas.auth import UserCreate, UserOut,Token,LoginInuser
 from app.db import get_db
 from app.repositories.user_repo import UserRepository
+from app.routers.deps import get_current_user
 from app.services.auth_service import AuthService
+from app.utils.admission import Overloaded
+from app.utils.hash_pool import PoolSaturated
 from app.utils.rate_limiter import RateLimiter
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -10,13 +14,14 @@
 cache_client = None
 
 @router.post("/register", response_model=UserOut, status_code=201)
-async def register(payload: UserCreate, request: Request, db=Depends(get_db)):
+async def register(payload: UserCreate, request: Request, response: Response, db=Depends(get_db)):
     
     ip = request.client.host if request.client else "anonymous"
     limiter = RateLimiter(cache_client)
-    allowed = await limiter.is_allowed(f"register:{ip}")
-    if not allowed:
-        raise HTTPException(status_code=429, detail="Too many requests - try later")
+    rl = await limiter.hit(f"register:{ip}")
+    if not rl.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests - try later", headers=rl.headers())
+    response.headers.update(rl.headers())
 
     repo = UserRepository(db)
     service = AuthService(repo)
@@ -24,24 +29,36 @@ async def register(payload: UserCreate, request: Request, db=Depends(get_db)):
         user = await service.register(payload.first_name, payload.last_name, payload.email, payload.password)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Server busy - try later", headers={"Retry-After": "1"})
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="Server busy - try later", headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
     return user
 
 @router.post("/login", response_model=Token)
-async def login(payload: LoginInuser, request: Request, db=Depends(get_db)):
+async def login(payload: LoginInuser, request: Request, response: Response, db=Depends(get_db)):
     
     ip = request.client.host if request.client else "anonymous"
     limiter = RateLimiter(cache_client)
-    allowed = await limiter.is_allowed(f"login:{ip}")
-    if not allowed:
-        raise HTTPException(status_code=429, detail="Too many requests - try later")
+    rl = await limiter.hit(f"login:{ip}")
+    if not rl.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests - try later", headers=rl.headers())
+    response.headers.update(rl.headers())
 
     repo = UserRepository(db)
     service = AuthService(repo)
     try:
-        token = await service.login(payload.email, payload.password)
+        token, user = await service.login(payload.email, payload.password)
     except ValueError:
 
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    
-    user = await repo.get_by_email(payload.email)
-    return {"access_token": token, "token_type": "bearer", "user": user}
\ No newline at end of file
+    except PoolSaturated:
+        raise HTTPException(status_code=503, detail="Server busy - try later", headers={"Retry-After": "1"})
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="Server busy - try later", headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+
+    return {"access_token": token, "token_type": "bearer", "user": user}
+
+@router.get("/me", response_model=UserOut)
+async def me(user=Depends(get_current_user)):
+    return user
\ No newline at end of file
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from app.schemas.calorie import CalorieRequest
-from app.services.calories_service import USDAClient, CaloriesService
+import hashlib
+import math
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from app.schemas.calorie import CalorieRequest, CalorieBatchRequest
+from app.services.calories_service import USDAClient, CaloriesService, UpstreamUnavailable, normalize_dish
 from app.config import settings
+from app.db import get_db
+from app.repositories.food_repo import FoodRepository
+from app.routers.deps import get_optional_user, rate_limit_key
+from app.utils.admission import Overloaded
 from app.utils.cache import InMemoryCache
 from app.utils.rate_limiter import RateLimiter
 
@@ -10,20 +17,130 @@
 # placeholders that will be set in app startup
 usda_client = None
 cache_client = None
+record_cache = None
+meal_log = None
 
 @router.post("/get-calories")
-async def get_calories(payload: CalorieRequest, request: Request):
-    ip = request.client.host if request.client else "anonymous"
+async def get_calories(payload: CalorieRequest, request: Request, response: Response, db=Depends(get_db), user=Depends(get_optional_user)):
     limiter = RateLimiter(cache_client)
-    allowed = await limiter.is_allowed(ip)
-    if not allowed:
-        raise HTTPException(status_code=429, detail="Too many requests")
+    rl = await limiter.hit(rate_limit_key(request, user))
+    if not rl.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests", headers=rl.headers())
+    response.headers.update(rl.headers())
 
-    cs = CaloriesService(usda_client, cache_client)
+    cs = CaloriesService(usda_client, cache_client, food_repo=FoodRepository(db), records=record_cache)
     try:
         res = await cs.get_calories(payload.dish_name, payload.servings)
     except LookupError:
         raise HTTPException(status_code=404, detail="Dish not found or calorie info missing")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail="Calorie data source unavailable - try later", headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="Server busy - try later", headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
+    if user is not None and meal_log is not None:
+        meal_log.add(user.id, res)
     return res
+
+
+def calorie_etag(record, servings: float) -> str:
+    """Stable strong ETag from the matched FDC record (id, energy and the other fields in the body) and servings."""
+    raw = f"v1:{record.to_list()!r}:{servings!r}".encode()
+    return '"' + hashlib.blake2b(raw, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        # If-None-Match uses weak comparison
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@router.get("/calories")
+async def get_calories_cacheable(
+    request: Request,
+    dish: str = Query(..., min_length=2, max_length=255),
+    servings: float = Query(1.0, gt=0),
+    db=Depends(get_db),
+):
+    """Idempotent, HTTP-cacheable variant of /get-calories for CDNs and reverse proxies.
+
+    The body doesn't depend on who asks, so no user lookup or meal logging happens here and
+    RateLimit headers are left out (shared caches would replay them).
+    """
+    limiter = RateLimiter(cache_client)
+    rl = await limiter.hit(rate_limit_key(request))
+    if not rl.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests", headers=rl.headers())
+
+    cs = CaloriesService(usda_client, cache_client, food_repo=FoodRepository(db), records=record_cache)
+    try:
+        record = await cs.lookup(dish)
+    except LookupError:
+        raise HTTPException(
+            status_code=404,
+            detail="Dish not found or calorie info missing",
+            headers={"Cache-Control": f"public, max-age={settings.CALORIE_NEGATIVE_TTL}"},
+        )
+    except UpstreamUnavailable as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Calorie data source unavailable - try later",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after))), "Cache-Control": "no-store"},
+        )
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy - try later",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after))), "Cache-Control": "no-store"},
+        )
+
+    headers = {
+        "ETag": calorie_etag(record, servings),
+        "Cache-Control": f"public, max-age={settings.CALORIES_HTTP_MAX_AGE}, stale-while-revalidate={settings.CALORIES_HTTP_STALE}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(cs.build_result(dish, servings, record), headers=headers)
+
+
+@router.post("/get-calories/batch")
+async def get_calories_batch(payload: CalorieBatchRequest, request: Request, response: Response, db=Depends(get_db), user=Depends(get_optional_user)):
+    limiter = RateLimiter(cache_client)
+    # one weighted charge for the whole meal instead of one per item
+    unique = {normalize_dish(item.dish_name) for item in payload.items}
+    cost = min(limiter.limit, math.ceil(len(unique) / settings.BATCH_ITEMS_PER_RATE_TOKEN))
+    rl = await limiter.hit(rate_limit_key(request, user), cost=cost)
+    if not rl.allowed:
+        raise HTTPException(status_code=429, detail="Too many requests", headers=rl.headers())
+    response.headers.update(rl.headers())
+
+    cs = CaloriesService(usda_client, cache_client, food_repo=FoodRepository(db), records=record_cache)
+    resolved = await cs.lookup_many([item.dish_name for item in payload.items], concurrency=settings.BATCH_CONCURRENCY)
+
+    items = []
+    errors = []
+    total = 0.0
+    for index, item in enumerate(payload.items):
+        record = resolved[normalize_dish(item.dish_name)]
+        if isinstance(record, LookupError):
+            errors.append({"index": index, "dish_name": item.dish_name, "status_code": 404, "detail": "Dish not found or calorie info missing"})
+        elif isinstance(record, UpstreamUnavailable):
+            errors.append({"index": index, "dish_name": item.dish_name, "status_code": 503, "detail": "Calorie data source unavailable - try later"})
+        elif isinstance(record, Overloaded):
+            errors.append({"index": index, "dish_name": item.dish_name, "status_code": 503, "detail": "Server busy - try later"})
+        elif isinstance(record, BaseException):
+            cs.logger.warning("Batch lookup failed for %s: %r", item.dish_name, record)
+            errors.append({"index": index, "dish_name": item.dish_name, "status_code": 502, "detail": "Calorie lookup failed"})
+        else:
+            res = cs.build_result(item.dish_name, item.servings, record)
+            if user is not None and meal_log is not None:
+                meal_log.add(user.id, res)
+            total += res["total_calories"]
+            items.append({"index": index, **res})
+    return {"items": items, "errors": errors, "total_calories": round(total, 2)}
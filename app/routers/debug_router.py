@@ -0,0 +1,34 @@
+import hmac
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from app.config import settings
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+# placeholder that will be set in create_app when profiling is enabled
+profile_store = None
+
+
+def _check_token(token: str | None):
+    # without a configured token the profiles are only readable on disk
+    if profile_store is None or not settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token.encode("latin-1"), settings.PROFILING_TOKEN.encode("latin-1")):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@router.get("/profiles", include_in_schema=False)
+def list_profiles(limit: int = Query(50, ge=1, le=500), x_profile: str | None = Header(None)):
+    """Recent request profiles, newest first, with each one's slowest functions."""
+    _check_token(x_profile)
+    return {"profiles": profile_store.recent(limit)}
+
+
+@router.get("/profiles/{profile_id}", include_in_schema=False)
+def download_profile(profile_id: str, x_profile: str | None = Header(None)):
+    """The pstats file of one profile (open with snakeviz or `python -m pstats`)."""
+    _check_token(x_profile)
+    path = profile_store.file_for(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -0,0 +1,63 @@
+import time
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import JWTError
+from app.config import settings
+from app.db import get_db
+from app.repositories.user_repo import UserRepository
+from app.utils.cache import LRUCache
+from app.utils.security import decode_access_token
+
+bearer = HTTPBearer(auto_error=False)
+
+# verified claims by token (kept until the token expires) and User rows by id (short TTL)
+claims_cache = LRUCache(settings.TOKEN_CACHE_SIZE)
+user_cache = LRUCache(settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+def _unauthorized():
+    return HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+
+
+def verify_token(token: str) -> dict:
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = decode_access_token(token)
+    except JWTError:
+        raise _unauthorized()
+    ttl = claims.get("exp", 0) - time.time()
+    if ttl > 0:
+        claims_cache.set(token, claims, ttl=ttl)
+    return claims
+
+
+async def get_optional_user(creds: HTTPAuthorizationCredentials | None = Depends(bearer), db=Depends(get_db)):
+    """The authenticated user, or None for anonymous requests. A bad token is still a 401."""
+    if creds is None:
+        return None
+    claims = verify_token(creds.credentials)
+    try:
+        user_id = int(claims["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise _unauthorized()
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await UserRepository(db).get_by_id(user_id)
+        if user is None or not user.is_active:
+            raise _unauthorized()
+        user_cache.set(user_id, user)
+    return user
+
+
+async def get_current_user(user=Depends(get_optional_user)):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+def rate_limit_key(request: Request, user=None) -> str:
+    if user is not None:
+        return f"user:{user.id}"
+    return request.client.host if request.client else "anonymous"
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Query
+from app.services.calories_service import CaloriesService, normalize_dish
+
+router = APIRouter(prefix="/dishes", tags=["dishes"])
+
+
+@router.get("/suggest")
+async def suggest(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=25)):
+    """Dish names we have already resolved (plus local catalog names), ranked by popularity and match."""
+    return {"query": q, "suggestions": CaloriesService.suggestions.suggest(normalize_dish(q), limit)}
@@ -0,0 +1,42 @@
+from datetime import date, datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.db import get_db
+from app.repositories.meal_repo import MealRepository
+from app.routers.deps import get_current_user
+
+router = APIRouter(prefix="/meals", tags=["meals"])
+
+
+@router.get("/summary")
+async def summary(
+    start: date | None = Query(None, description="first day (UTC), defaults to `days` before `end`"),
+    end: date | None = Query(None, description="last day (UTC), defaults to today"),
+    days: int = Query(7, ge=1, le=366),
+    db=Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Daily calorie and macro totals from the pre-aggregated rollup (entries appear within about a second)."""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=days - 1)
+    if start > end or (end - start).days >= 366:
+        raise HTTPException(status_code=400, detail="Invalid date range")
+
+    rows = await MealRepository(db).daily_totals(user.id, start, end)
+    out = [
+        {
+            "date": row.day.isoformat(),
+            "entries": row.entries,
+            "total_calories": round(row.calories, 2),
+            "protein_g": round(row.protein_g, 2),
+            "fat_g": round(row.fat_g, 2),
+            "carbohydrate_g": round(row.carbohydrate_g, 2),
+        }
+        for row in rows
+    ]
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": out,
+        "total_calories": round(sum(d["total_calories"] for d in out), 2),
+        "entries": sum(d["entries"] for d in out),
+    }
@@ -3,3 +3,6 @@
 class CalorieRequest(BaseModel):
     dish_name: str = Field(..., min_length=2)
     servings: float = Field(..., gt=0)
+
+class CalorieBatchRequest(BaseModel):
+    items: list[CalorieRequest] = Field(..., min_items=1, max_items=50)
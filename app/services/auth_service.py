@@ -1,28 +1,69 @@
+from contextlib import nullcontext
+from app.config import settings
 from app.repositories.user_repo import UserRepository
-from app.utils.security import hash_password, verify_password, create_access_token
+from app.utils.admission import AdaptiveLimiter
+from app.utils.hash_pool import PasswordHasher, PoolSaturated
+from app.utils.metrics import STAGE_SECONDS
+from app.utils.security import needs_rehash, create_access_token
 import logging
 
 class AuthService:
     logger = logging.getLogger("meal_calorie_app.AuthService")
     logger.setLevel(logging.INFO)
+    # shared by all requests in the worker; bcrypt runs on its threads, not the event loop
+    hasher = PasswordHasher(settings.HASH_POOL_WORKERS, settings.HASH_POOL_QUEUE)
+    # caps concurrent register/login requests in the worker
+    admission = AdaptiveLimiter(
+        "auth",
+        initial_limit=settings.AUTH_CONCURRENCY,
+        min_limit=settings.ADMISSION_MIN_LIMIT,
+        max_limit=settings.AUTH_MAX_CONCURRENCY,
+        target_latency=settings.AUTH_TARGET_LATENCY,
+        max_queue=settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        drop_on=(PoolSaturated,),
+    ) if settings.ADMISSION_CONTROL else None
 
-    def __init__(self, user_repo: UserRepository, logger: logging.Logger = logger):
+    def __init__(self, user_repo: UserRepository, logger: logging.Logger = logger, hasher: PasswordHasher = hasher,
+                 admission: AdaptiveLimiter | None = admission):
         self.user_repo = user_repo
         self.logger = logger
+        self.hasher = hasher
+        self.admission = admission
+
+    def _slot(self):
+        return self.admission.slot() if self.admission is not None else nullcontext()
 
     async def register(self, first_name, last_name, email, password):
+        with STAGE_SECONDS.time("auth_register"):
+            async with self._slot():
+                return await self._register(first_name, last_name, email, password)
+
+    async def _register(self, first_name, last_name, email, password):
         existing = await self.user_repo.get_by_email(email)
         if existing:
             raise ValueError("Email already registered")
-        hashed = hash_password(password)
+        hashed = await self.hasher.hash(password)
         user = await self.user_repo.create_user(first_name, last_name, email, hashed)
         self.logger.info("Registered new user: %s", email)
         return user
 
     async def login(self, email, password):
+        with STAGE_SECONDS.time("auth_login"):
+            async with self._slot():
+                return await self._login(email, password)
+
+    async def _login(self, email, password):
         user = await self.user_repo.get_by_email(email)
-        if not user or not verify_password(password, user.hashed_password):
-            self.logger.warning("Failed login attempt for user: %s", email)
+        if not user or not await self.hasher.verify(password, user.hashed_password):
+            # sampled: a credential-stuffing run must not turn into a log line per attempt
+            self.logger.warning("Failed login attempt for user: %s", email, extra={"sample_key": "auth.failed_login"})
             raise ValueError("Invalid credentials")
+        if needs_rehash(user.hashed_password):
+            try:
+                await self.user_repo.update_password(user, await self.hasher.hash(password))
+                self.logger.info("Rehashed password for user %s with cost %s", email, settings.BCRYPT_ROUNDS)
+            except PoolSaturated:
+                pass
         token = create_access_token({"sub": str(user.id)})
-        return token
+        return token, user
@@ -1,153 +1,628 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
 import httpx
+from sqlalchemy.exc import SQLAlchemyError
 from app.config import settings
+from app.db import AsyncSessionLocal
+from app.repositories.food_repo import FoodRepository
+from app.services.nutrition import FoodRecord, parse_foods_payload, parse_search_payload
+from app.utils.cache import LRUCache, RecordCache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.utils.codec import NOT_FOUND, RecordCodec
 from app.utils.fuzzy import best_match
+from app.utils.heavy_hitters import SpaceSaving
+from app.utils.admission import AdaptiveLimiter
+from app.utils.metrics import STAGE_SECONDS, USDA_RESPONSES
+from app.utils.rate_limiter import RateLimiter
+from app.utils.refresher import BackgroundRefresher
+from app.utils.singleflight import SingleFlight
+from app.utils.suggest import SuggestIndex
+
+
+def normalize_dish(dish_name: str) -> str:
+    return " ".join(dish_name.lower().split())
+
+
+class UpstreamUnavailable(Exception):
+    """USDA could not be reached (circuit open, retries exhausted); `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 
 class USDAClient:
     BASE = "https://api.nal.usda.gov/fdc/v1/foods/search"
-    def __init__(self, api_key: str, http_client: httpx.AsyncClient | None = None):
+    FOODS = "https://api.nal.usda.gov/fdc/v1/foods"
+    # nutrient numbers requested from /foods: energy (208, or the Atwater 957/958 that foods
+    # without 208 carry) and the three macros
+    FOODS_NUTRIENTS = [208, 957, 958, 203, 204, 205]
+    def __init__(self, api_key: str, http_client: httpx.AsyncClient | None = None, breaker: CircuitBreaker | None = None):
         self.api_key = api_key
-        self._client = http_client or httpx.AsyncClient(timeout=10)
+        self._client = http_client or httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.USDA_READ_TIMEOUT, connect=settings.USDA_CONNECT_TIMEOUT, pool=settings.USDA_POOL_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.USDA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.USDA_MAX_KEEPALIVE,
+                keepalive_expiry=settings.USDA_KEEPALIVE_EXPIRY,
+            ),
+            http2=settings.USDA_HTTP2 and _h2_available(),
+        )
+        self.breaker = breaker or CircuitBreaker(settings.USDA_BREAKER_FAILURES, settings.USDA_BREAKER_RESET)
+        self.retries = settings.USDA_RETRIES
+        self._latencies = deque(maxlen=200)
+        self.hedged = 0
+        self.retried = 0
+        # X-RateLimit-Remaining from the last api.data.gov response, if any
+        self.quota_remaining = None
+        # set by USDAScheduler: every request actually sent (retries and hedges too) spends quota
+        self.quota = None
 
-    async def search(self, query: str, page_size: int = 10):
+    async def search_records(self, query: str, page_size: int = 10) -> list[FoodRecord]:
         params = {"api_key": self.api_key, "query": query, "pageSize": page_size}
-        r = await self._client.get(self.BASE, params=params)
-        r.raise_for_status()
-        return r.json()
+        r = await self._request(params)
+        return parse_search_payload(r.content)
+
+    async def get_foods(self, fdc_ids: list[int]) -> list[FoodRecord]:
+        """Fetch up to 20 foods by FDC ID in one request (one unit of API quota)."""
+        body = {"fdcIds": list(fdc_ids), "format": "abridged", "nutrients": self.FOODS_NUTRIENTS}
+        r = await self._request({"api_key": self.api_key}, body)
+        return parse_foods_payload(r.content)
+
+    async def _request(self, params: dict, body: dict | None = None):
+        for attempt in range(self.retries + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitOpen as e:
+                raise UpstreamUnavailable("USDA API temporarily unavailable", retry_after=e.retry_after)
+
+            delay = None
+            try:
+                r = await self._send(params, body)
+            except httpx.TransportError as e:
+                USDA_RESPONSES.inc("error")
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise UpstreamUnavailable(f"USDA API request failed: {e!r}")
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                if r.status_code not in RETRY_STATUSES:
+                    # anything else (including 4xx) means USDA is up
+                    self.breaker.record_success()
+                    r.raise_for_status()
+                    return r
+                self.breaker.record_failure()
+                delay = _retry_after(r)
+                if attempt == self.retries or (delay is not None and delay > settings.USDA_RETRY_MAX_DELAY):
+                    raise UpstreamUnavailable(f"USDA API returned {r.status_code}", retry_after=delay or 1.0)
+
+            self.retried += 1
+            if delay is None:
+                # full jitter exponential backoff
+                delay = random.uniform(0, settings.USDA_RETRY_BACKOFF * (2 ** attempt))
+            await asyncio.sleep(min(delay, settings.USDA_RETRY_MAX_DELAY))
+
+    async def _send(self, params: dict, body: dict | None = None):
+        if self.quota is not None:
+            await self.quota.acquire()
+        start = time.perf_counter()
+        hedge_delay = self._hedge_delay()
+        if body is not None:
+            r = await self._client.post(self.FOODS, params=params, json=body)
+        elif hedge_delay is None:
+            r = await self._client.get(self.BASE, params=params)
+        else:
+            r = await self._send_hedged(params, hedge_delay)
+        elapsed = time.perf_counter() - start
+        self._latencies.append(elapsed)
+        STAGE_SECONDS.observe(elapsed, "usda_request")
+        USDA_RESPONSES.inc(str(r.status_code))
+        remaining = r.headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            self.quota_remaining = int(remaining)
+        return r
+
+    def _hedge_delay(self):
+        pct = settings.USDA_HEDGE_PERCENTILE
+        if not pct or len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    async def _send_hedged(self, params: dict, hedge_delay: float):
+        """Send a duplicate request if the first is slower than `hedge_delay`; first answer wins."""
+        tasks = [asyncio.ensure_future(self._client.get(self.BASE, params=params))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            # a hedge is optional: skip it rather than wait for quota
+            if not done and (self.quota is None or await self.quota.try_acquire()):
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(self._client.get(self.BASE, params=params)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        return task.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.opened_count,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "quota_remaining": self.quota_remaining,
+        }
 
     async def close(self):
         await self._client.aclose()
 
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _retry_after(r: httpx.Response):
+    value = r.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# priorities of USDA calls through USDAScheduler, most urgent first
+INTERACTIVE, REFRESH, WARMUP = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "refresh", "warmup")
+# priority of the USDA calls made by the current task; background work sets its own
+usda_priority: ContextVar[int] = ContextVar("usda_priority", default=INTERACTIVE)
+
+
+def _flight_key(dish_key: str) -> str:
+    # refreshes and warm-up coalesce only among themselves: a user request following their
+    # leader would wait for quota at the leader's background priority
+    return dish_key if usda_priority.get() == INTERACTIVE else f"bg:{dish_key}"
+
+
+class USDAScheduler:
+    """Spends the API key's request quota, interactive lookups first.
+
+    The quota is a token bucket of `quota` requests per `window` seconds, kept with the GCRA
+    rate limiter on the shared cache so every worker draws from the same budget. The client
+    takes a token for each request it sends, retries and hedges included. While tokens are
+    left requests go straight through; once they run out, callers queue by the
+    `usda_priority` of their task and are let through in that order as tokens come back.
+    Interactive callers give up after `max_wait` seconds with UpstreamUnavailable; background
+    callers wait, but at most `max_waiting` of them.
+
+    It also remembers which FDC food each dish resolved to (`fdc_ids`), so a refresh can fetch
+    that food by ID: `get_food` calls made within `batch_window` seconds of each other share
+    one multi-item `/foods` request.
+    """
+
+    logger = logging.getLogger("meal_calorie_app.USDAScheduler")
+    BATCH_MAX = 20  # FDC's limit on fdcIds per /foods request
+
+    def __init__(self, usda: USDAClient, cache=None, quota: int = 1000, window: int = 3600, max_wait: float = 2.0,
+                 max_waiting: int = 1000, batch_window: float = 0.05, known_foods: int = 20_000):
+        self.usda = usda
+        self.usda.quota = self
+        self.limiter = RateLimiter(cache, limit=quota, window=window, name="usda_quota")
+        self.max_wait = max_wait
+        self.max_waiting = max_waiting
+        self.batch_window = batch_window
+        self.fdc_ids = LRUCache(known_foods)
+        self._waiting: list = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self._retry_after = 1.0
+        self._batch: dict = {}  # fdc_id -> future
+        self._batch_priority = WARMUP
+        self._batch_timer = None
+        self._batch_tasks: set = set()
+        self._remaining = (quota, time.monotonic())
+        self.granted = [0, 0, 0]
+        self.rejected = 0
+        self.batches = 0
+        self.batched_foods = 0
+
+    async def search_records(self, query: str, page_size: int = 10) -> list[FoodRecord]:
+        return await self.usda.search_records(query, page_size)
+
+    async def acquire(self, priority: int | None = None):
+        """Wait for one request's worth of quota."""
+        priority = usda_priority.get() if priority is None else priority
+        if not self._waiting and await self._take():
+            self.granted[priority] += 1
+            return
+        if priority != INTERACTIVE and len(self._waiting) >= self.max_waiting:
+            self.rejected += 1
+            raise UpstreamUnavailable("USDA API quota queue is full", retry_after=self._retry_after)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), fut))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            await asyncio.wait_for(fut, self.max_wait if priority == INTERACTIVE else None)
+        except asyncio.TimeoutError:
+            # the cancelled future stays in the heap; the dispatcher skips it
+            self.rejected += 1
+            raise UpstreamUnavailable("USDA API quota exhausted", retry_after=self._retry_after)
+        self.granted[priority] += 1
+
+    async def try_acquire(self) -> bool:
+        """Take a token only if one is free now and nobody is queued for it."""
+        if self._waiting or not await self._take():
+            return False
+        self.granted[usda_priority.get()] += 1
+        return True
+
+    async def _take(self) -> bool:
+        rl = await self.limiter.hit("usda:quota")
+        self._remaining = (rl.remaining, time.monotonic())
+        if not rl.allowed:
+            self._retry_after = rl.retry_after
+        return rl.allowed
+
+    async def _dispatch(self):
+        while self._waiting:
+            if self._waiting[0][2].done():
+                heapq.heappop(self._waiting)
+                continue
+            if not await self._take():
+                await asyncio.sleep(self._retry_after)
+                continue
+            # hand the token to the most urgent caller still waiting
+            while self._waiting:
+                fut = heapq.heappop(self._waiting)[2]
+                if not fut.done():
+                    fut.set_result(None)
+                    break
+
+    async def get_food(self, fdc_id: int) -> FoodRecord | None:
+        """The food with this FDC ID, or None if FDC no longer has it."""
+        fut = self._batch.get(fdc_id)
+        if fut is None:
+            fut = self._batch[fdc_id] = asyncio.get_running_loop().create_future()
+            self._batch_priority = min(self._batch_priority, usda_priority.get())
+            if len(self._batch) >= self.BATCH_MAX:
+                self._send_batch()
+            elif self._batch_timer is None:
+                self._batch_timer = asyncio.get_running_loop().call_later(self.batch_window, self._send_batch)
+        return await asyncio.shield(fut)
+
+    def _send_batch(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, priority = self._batch, self._batch_priority
+        self._batch, self._batch_priority = {}, WARMUP
+        if batch:
+            task = asyncio.ensure_future(self._fetch_batch(batch, priority))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _fetch_batch(self, batch: dict, priority: int):
+        # this task has its own context: the client's quota calls see the batch's priority
+        usda_priority.set(priority)
+        try:
+            records = await self.usda.get_foods(list(batch))
+        except asyncio.CancelledError:
+            for fut in batch.values():
+                fut.cancel()
+            raise
+        except Exception as e:
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+                    # waiters that were cancelled will never retrieve it
+                    fut.exception()
+            return
+        self.batches += 1
+        self.batched_foods += len(batch)
+        found = {r.fdc_id: r for r in records}
+        for fdc_id, fut in batch.items():
+            if not fut.done():
+                fut.set_result(found.get(fdc_id))
+
+    @property
+    def quota_remaining(self) -> int:
+        # the limiter only reports at each call; add what has refilled since
+        remaining, at = self._remaining
+        refilled = (time.monotonic() - at) / self.limiter.period
+        return min(self.limiter.limit, int(remaining + refilled))
+
+    def stats(self):
+        stats = {
+            "quota_remaining": self.quota_remaining,
+            "waiting": sum(1 for _, _, fut in self._waiting if not fut.done()),
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "batched_foods": self.batched_foods,
+            "known_foods": len(self.fdc_ids),
+        }
+        for name, granted in zip(PRIORITY_NAMES, self.granted):
+            stats[f"granted_{name}"] = granted
+        return stats
+
+    async def close(self):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        tasks = [t for t in (self._dispatcher, *self._batch_tasks) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for fut in [*self._batch.values(), *(w[2] for w in self._waiting)]:
+            fut.cancel()
+        self._batch.clear()
+        self._waiting.clear()
+        await self.usda.close()
+
+
 class CaloriesService:
-    def __init__(self, usda_client: USDAClient, cache=None):
+    # shared across the per-request service instances so concurrent misses coalesce
+    flight = SingleFlight(dumps=RecordCodec.dumps, loads=RecordCodec.loads_record)
+
+    # stale-while-revalidate refreshes, shared so they are deduplicated across requests
+    refresher = BackgroundRefresher(settings.REFRESH_CONCURRENCY, settings.REFRESH_MAX_PENDING)
+
+    # most requested dishes, snapshotted on shutdown to warm the cache on the next start
+    hot_dishes = SpaceSaving(settings.HOT_DISHES_CAPACITY)
+    # resolved dish names for /dishes/suggest
+    suggestions = SuggestIndex(settings.SUGGEST_MAX_ENTRIES)
+    # caps concurrent cache misses; cache hits never wait on it
+    admission = AdaptiveLimiter(
+        "calories",
+        initial_limit=settings.CALORIES_CONCURRENCY,
+        min_limit=settings.ADMISSION_MIN_LIMIT,
+        max_limit=settings.CALORIES_MAX_CONCURRENCY,
+        target_latency=settings.CALORIES_TARGET_LATENCY,
+        max_queue=settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        drop_on=(UpstreamUnavailable,),
+    ) if settings.ADMISSION_CONTROL else None
+
+    logger = logging.getLogger("meal_calorie_app.CaloriesService")
+
+    def __init__(self, usda_client: USDAClient, cache=None, flight: SingleFlight = flight, food_repo=None,
+                 records: RecordCache | None = None, refresher: BackgroundRefresher = refresher,
+                 hot_dishes: SpaceSaving | None = hot_dishes, suggestions: SuggestIndex | None = suggestions,
+                 admission: AdaptiveLimiter | None = admission):
         self.usda = usda_client
         self.cache = cache
-
-    def _extract_energy(self, food_item: dict):
-        """Try multiple places to extract energy (kcal) and serving info:
-           - foodNutrients (nutrientNumber 208)
-           - labelNutrients (if present)
-           - foodPortions / servingSize / servingSizeUnit
-           Returns tuple (calories_value, per_unit, unit_description)
-           per_unit: 'serving' or '100g' or 'g' (value is per unit)
-        """
-        # 1) foodNutrients
-        nutrients = food_item.get('foodNutrients', []) or []
-        for n in nutrients:
-            num = str(n.get('nutrientNumber') or n.get('nutrientId') or '')
-            name = (n.get('nutrientName') or '').lower()
-            if num == '208' or 'energy' in name:
-                # value is commonly in kcal per the item measurement  USDA often uses per 100g or per serving depending on item
-                value = n.get('value')
-                unit_name = n.get('unitName') or n.get('nutrientUnitName') or ''
-                return value, None, f"nutrient:{unit_name}"
-
-        # 2) labelNutrients (some branded foods)
-        label = food_item.get('labelNutrients') or {}
-        if label:
-            for k, v in label.items():
-                if 'energy' in k.lower() or 'calor' in k.lower():
-                    val = v.get('value') or v
-                    return val, None, 'label'
-
-        # 3) Check 'servingSize' fields
-        ss = food_item.get('servingSize')
-        ss_unit = food_item.get('servingSizeUnit')
-        if ss and ss_unit:
-            return None, 'serving', f"{ss} {ss_unit}"
-
-        # 4) foodPortions: sometimes contains gram weights for portions
-        portions = food_item.get('foodPortions') or []
-        for p in portions:
-            # look for gram amount and portion description
-            if str(p.get('amount')).isdigit() or isinstance(p.get('gramWeight'), (int, float)):
-                # We return info to indicate grams per portion
-                gram = p.get('gramWeight')
-                desc = p.get('portionDescription') or p.get('modifier') or ''
-                if gram:
-                    return None, 'g', f"{gram}g ({desc})"
-
-        return None, None, ''
+        self.records = records or RecordCache(
+            cache,
+            ttl=settings.CALORIE_CACHE_TTL,
+            negative_ttl=settings.CALORIE_NEGATIVE_TTL,
+            hard_ttl=settings.CALORIE_HARD_TTL,
+            stale_ttl=settings.CALORIE_STALE_TTL,
+        )
+        self.flight = flight
+        self.refresher = refresher
+        self.hot_dishes = hot_dishes
+        self.suggestions = suggestions
+        self.admission = admission
+        self.food_repo = food_repo if settings.LOCAL_FOOD_INDEX else None
 
     async def get_calories(self, dish_name: str, servings: float):
         if servings <= 0:
             raise ValueError("Servings must be > 0")
 
-        cache_key = f"cal:{dish_name.lower()}:{servings}"
-        if self.cache:
-            cached = await self.cache.get(cache_key)
-            if cached:
-                return cached
+        record = await self.lookup(dish_name)
+        return self.build_result(dish_name, servings, record)
 
-        data = await self.usda.search(dish_name, page_size=25)
-        foods = data.get('foods', []) or []
-        if not foods:
+    async def lookup(self, dish_name: str):
+        """Resolve the servings-independent record for a dish, via the record cache when possible."""
+        dish_key = normalize_dish(dish_name)
+        if self.hot_dishes is not None:
+            self.hot_dishes.add(dish_key)
+        with STAGE_SECONDS.time("cache_get"):
+            entry = await self.records.get_entry(dish_key)
+        if entry is None:
+            record = await self._coalesced(dish_name, dish_key)
+        else:
+            record = self._from_cache(dish_name, dish_key, entry)
+        if self.suggestions is not None:
+            self.suggestions.add(dish_key, record.name)
+        return record
+
+    def _from_cache(self, dish_name: str, dish_key: str, entry):
+        record = entry[0]
+        if record is NOT_FOUND:
             raise LookupError("Dish not found")
+        if self.records.needs_refresh(entry):
+            # past the soft TTL: answer now, refresh in the background
+            self.refresher.stale_served += 1
+            self.refresher.schedule(dish_key, lambda: self._refresh(dish_name, dish_key, record.fdc_id))
+        return record
 
-        candidates = []
-        id_map = {}
-        for f in foods:
-            name = f.get('description') or f.get('lowercaseDescription') or f.get('dataType') or ''
-            candidates.append(name)
-            id_map[name] = f
+    async def lookup_many(self, dish_names: list[str], concurrency: int = 4) -> dict:
+        """Resolve several dishes at once, keyed by normalized name.
 
-        match = best_match(dish_name, candidates, limit=1)
-        if not match:
-            chosen = foods[0]
-        else:
-            chosen_name, score, idx = match[0]
-            chosen = id_map.get(chosen_name, foods[0])
-
-        
-        energy_val, per_unit, unit_desc = self._extract_energy(chosen)
-
-        # If we got a direct energy value assume it's per 100g unless meta indicates per serving
-        calories_per_serving = None
-        if energy_val is not None:
-            
-            data_type = chosen.get('dataType', '').lower()
-            if 'branded' in data_type or 'survey' in data_type or 'foundation' in data_type:
-                calories_per_serving = float(energy_val)
-            else:
-                serving_size = chosen.get('servingSize')
-                if serving_size:
-                    calories_per_serving = float(energy_val)
-                else:
-                    
-                    gram = None
-                    portions = chosen.get('foodPortions') or []
-                    for p in portions:
-                        if p.get('gramWeight'):
-                            gram = p.get('gramWeight')
-                            break
-                    if gram:
-                        calories_per_serving = float(energy_val) * (gram / 100.0)
-                    else:
-                        calories_per_serving = float(energy_val)
-
-        if calories_per_serving is None and per_unit in ('serving', 'g'):
-            nutrients = chosen.get('foodNutrients', []) or []
-            for n in nutrients:
-                name = (n.get('nutrientName') or '').lower()
-                if 'energy' in name or n.get('nutrientNumber') == 208:
-                    val = n.get('value')
-                    calories_per_serving = float(val)
-                    break
+        Cached records come from one multi-get; the misses fan out with at most `concurrency`
+        in flight. Values are records, or the exception raised for that dish.
+        """
+        names = {}
+        for dish_name in dish_names:
+            names.setdefault(normalize_dish(dish_name), dish_name)
+        if self.hot_dishes is not None:
+            for key in names:
+                self.hot_dishes.add(key)
+        found = {}
+        for key, entry in (await self.records.get_many_entries(list(names))).items():
+            try:
+                found[key] = self._from_cache(names[key], key, entry)
+            except LookupError as e:
+                found[key] = e
 
-        if calories_per_serving is None:
-            raise LookupError("Calorie info not available for best match")
+        misses = [key for key in names if key not in found]
+        service = self
+        if self.food_repo is not None:
+            # the request's DB session can't run concurrent queries, so the local index is read
+            # one dish at a time before the fan-out, which then only goes upstream
+            for key in misses:
+                with STAGE_SECONDS.time("local_index"):
+                    record = await self._lookup_local(names[key])
+                if record:
+                    await self.records.set(key, record)
+                    found[key] = record
+            misses = [key for key in misses if key not in found]
+            service = CaloriesService(
+                self.usda, self.cache, flight=self.flight, records=self.records, refresher=self.refresher,
+                hot_dishes=self.hot_dishes, suggestions=self.suggestions, admission=self.admission,
+            )
+
+        sem = asyncio.Semaphore(concurrency)
 
-        total = calories_per_serving * servings
+        async def resolve(key):
+            async with sem:
+                return await service._coalesced(names[key], key)
+
+        results = await asyncio.gather(*[resolve(key) for key in misses], return_exceptions=True)
+        found.update(zip(misses, results))
+        if self.suggestions is not None:
+            for key, record in found.items():
+                if isinstance(record, FoodRecord):
+                    self.suggestions.add(key, record.name)
+        return found
+
+    async def _coalesced(self, dish_name: str, dish_key: str):
+        return await self.flight.do(
+            _flight_key(dish_key), lambda: self._admitted(dish_name, dish_key), cache=self.cache
+        )
+
+    async def _admitted(self, dish_name: str, dish_key: str):
+        # only the leader does upstream work, so only it takes an admission slot
+        async with self.admission.slot() if self.admission is not None else nullcontext():
+            return await self._resolve(dish_name, dish_key)
+
+    async def _resolve(self, dish_name: str, dish_key: str):
+        # another worker may have resolved it while we waited on the shared lock
+        record = await self.records.get(dish_key)
+        if record is NOT_FOUND:
+            raise LookupError("Dish not found")
+        if record is not None:
+            return record
+        try:
+            return await self._fetch_and_store(dish_name, dish_key)
+        except UpstreamUnavailable:
+            stale = await self.records.get(dish_key, allow_stale=True)
+            if stale is None or stale is NOT_FOUND:
+                raise
+            self.logger.warning("USDA unavailable, serving stale record for %s", dish_key)
+            return stale
 
-        result = {
+    async def _fetch_and_store(self, dish_name: str, dish_key: str, negative: bool = True, fdc_id=None):
+        try:
+            record = await self._fetch_record(dish_name, fdc_id)
+        except LookupError:
+            if negative:
+                await self.records.set_not_found(dish_key)
+            raise
+        await self.records.set(dish_key, record)
+        return record
+
+    async def _refresh(self, dish_name: str, dish_key: str, fdc_id=None):
+        # a refresh that fails keeps the current record; it never replaces it with "not found"
+        fdc_ids = getattr(self.usda, "fdc_ids", None)
+        if fdc_ids is not None:
+            fdc_id = fdc_ids.get(dish_key, fdc_id)
+        token = usda_priority.set(REFRESH)
+        try:
+            if self.food_repo is None:
+                await self.flight.do(
+                    _flight_key(dish_key), lambda: self._fetch_and_store(dish_name, dish_key, False, fdc_id),
+                    cache=self.cache,
+                )
+                return
+            # the request's DB session is gone by the time this runs
+            async with AsyncSessionLocal() as session:
+                service = CaloriesService(
+                    self.usda, self.cache, flight=self.flight, food_repo=FoodRepository(session),
+                    records=self.records, refresher=self.refresher,
+                )
+                await self.flight.do(
+                    _flight_key(dish_key), lambda: service._fetch_and_store(dish_name, dish_key, False, fdc_id),
+                    cache=self.cache,
+                )
+        finally:
+            usda_priority.reset(token)
+
+    def build_result(self, dish_name: str, servings: float, record: FoodRecord):
+        calories_per_serving = record.calories_per_serving()
+        return {
             "dish_name": dish_name,
             "servings": servings,
             "calories_per_serving": round(calories_per_serving, 2),
-            "total_calories": round(total, 2),
-            "source": "USDA FoodData Central",
-            "matched_item": chosen.get('description') or chosen.get('lowercaseDescription') or ''
+            "total_calories": round(calories_per_serving * servings, 2),
+            "macros_per_serving": record.macros_per_serving(),
+            "source": record.source,
+            "matched_item": record.name,
+            "fdc_id": record.fdc_id,
         }
 
-        if self.cache:
-            await self.cache.set(cache_key, result, ex=60)
+    async def _fetch_record(self, dish_name: str, fdc_id=None) -> FoodRecord:
+        if self.food_repo is not None:
+            with STAGE_SECONDS.time("local_index"):
+                record = await self._lookup_local(dish_name)
+            if record:
+                return record
+
+        if fdc_id is not None and hasattr(self.usda, "get_food"):
+            # the food this dish matched before: one batched /foods request instead of a search
+            record = await self.usda.get_food(fdc_id)
+            if record is not None and record.calories_per_serving() is not None:
+                return record
+
+        records = await self.usda.search_records(dish_name, page_size=25)
+        if not records:
+            raise LookupError("Dish not found")
+
+        with STAGE_SECONDS.time("best_match"):
+            match = best_match(dish_name, [r.name or r.data_type for r in records], limit=1)
+        chosen = records[match[0][2]] if match else records[0]
+        if chosen.calories_per_serving() is None:
+            raise LookupError("Calorie info not available for best match")
+        fdc_ids = getattr(self.usda, "fdc_ids", None)
+        if fdc_ids is not None and chosen.fdc_id is not None:
+            fdc_ids.set(normalize_dish(dish_name), chosen.fdc_id)
+        return chosen
+
+    async def _lookup_local(self, dish_name: str):
+        try:
+            foods = await self.food_repo.search(normalize_dish(dish_name))
+        except SQLAlchemyError as e:
+            self.logger.warning("Local food index lookup failed, using USDA API: %s", e)
+            return None
+        if not foods:
+            return None
 
-        return result
+        match = best_match(dish_name, [f.description for f in foods], limit=1)
+        chosen = foods[match[0][2]] if match else foods[0]
+        return chosen.to_record()
@@ -0,0 +1,226 @@
+"""Streaming readers that turn USDA FoodData Central bulk downloads into `foods` rows.
+
+Supported inputs:
+  - the JSON downloads (foundation, SR legacy, survey, branded): one top-level key holding
+    an array of foods; items are decoded one at a time, the file is never loaded whole
+  - an unzipped CSV download directory containing food.csv, nutrient.csv and food_nutrient.csv
+    (food_portion.csv and branded_food.csv are used when present); the tables are joined by
+    sorting each on fdc_id with bounded memory, never by loading one into a dict
+"""
+import csv
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+from itertools import groupby, islice
+from operator import itemgetter
+from app.services.calories_service import normalize_dish
+from app.services.nutrition import FoodRecord
+
+ENERGY_NUMBERS = ("208", "957", "958")
+MACRO_NUMBERS = ("203", "204", "205")
+_decoder = json.JSONDecoder()
+
+
+def iter_json_foods(path: str, chunk_size: int = 1 << 20):
+    """Yield the items of the first top-level array in `path` without reading the whole file."""
+    with open(path, "r", encoding="utf-8") as fp:
+        buf = ""
+        pos = 0
+        while "[" not in buf:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                return
+            buf += chunk
+        pos = buf.index("[") + 1
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos >= len(buf):
+                    raise ValueError("need more data")
+                item, end = _decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                chunk = fp.read(chunk_size)
+                eof = not chunk
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+            pos = end
+            if pos > chunk_size:
+                buf = buf[pos:]
+                pos = 0
+
+
+def _json_to_search_item(food: dict) -> dict:
+    nutrients = []
+    for fn in food.get("foodNutrients") or []:
+        nutrient = fn.get("nutrient") or {}
+        number = str(nutrient.get("number"))
+        unit = (nutrient.get("unitName") or "").lower()
+        if fn.get("amount") is None:
+            continue
+        if number in MACRO_NUMBERS or (number in ENERGY_NUMBERS and unit == "kcal"):
+            nutrients.append({
+                "nutrientNumber": number,
+                "nutrientName": nutrient.get("name") or "",
+                "value": fn.get("amount"),
+                "unitName": nutrient.get("unitName") or "",
+            })
+    # prefer the classic 208 energy value over the Atwater variants
+    nutrients.sort(key=lambda n: n["nutrientNumber"] != "208")
+    label = food.get("labelNutrients") or {}
+    return {
+        "fdcId": food.get("fdcId"),
+        "description": food.get("description") or "",
+        "dataType": food.get("dataType") or "",
+        "publicationDate": food.get("publicationDate") or "",
+        "foodNutrients": nutrients,
+        "labelNutrients": {"calories": label["calories"]} if "calories" in label else {},
+        "servingSize": food.get("servingSize"),
+        "servingSizeUnit": food.get("servingSizeUnit"),
+        "foodPortions": [{"gramWeight": p.get("gramWeight")} for p in food.get("foodPortions") or [] if p.get("gramWeight")],
+    }
+
+
+def iter_csv_foods(directory: str, chunk_rows: int = 500_000):
+    """Merge-join the FDC CSV tables on fdc_id.
+
+    Each table is reduced to the columns used here and sorted by fdc_id in runs of `chunk_rows`
+    rows that spill to temporary files, then merged. Foods are yielded in fdc_id order and memory
+    stays bounded by one run, however large the download.
+    """
+    def rows(name):
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            return
+        with open(path, newline="", encoding="utf-8") as fp:
+            yield from csv.DictReader(fp)
+
+    wanted = {}
+    for n in rows("nutrient.csv"):
+        number = n.get("nutrient_nbr", "").split(".")[0]
+        if number in MACRO_NUMBERS or (number in ENERGY_NUMBERS and (n.get("unit_name") or "").lower() == "kcal"):
+            wanted[n["id"]] = number
+
+    with tempfile.TemporaryDirectory(prefix="fdc-ingest-") as tmp:
+        def by_fdc_id(name, columns, keep=lambda r: True):
+            return _external_sort(
+                ((int(r["fdc_id"]), *(r.get(c) or "" for c in columns)) for r in rows(name) if keep(r)),
+                chunk_rows, tmp,
+            )
+
+        nutrients = _group_cursor(by_fdc_id(
+            "food_nutrient.csv", ("nutrient_id", "amount"), lambda r: r["nutrient_id"] in wanted and r.get("amount")
+        ))
+        portions = _group_cursor(by_fdc_id("food_portion.csv", ("gram_weight",), lambda r: r.get("gram_weight")))
+        branded = _group_cursor(by_fdc_id("branded_food.csv", ("serving_size", "serving_size_unit")))
+
+        for fdc_id, description, data_type, publication_date in by_fdc_id(
+            "food.csv", ("description", "data_type", "publication_date")
+        ):
+            values = {}
+            for _, nutrient_id, amount in nutrients(fdc_id):
+                values.setdefault(wanted[nutrient_id], float(amount))
+            # keep one energy value, preferring the classic 208 over the Atwater variants
+            energy = next((num for num in ENERGY_NUMBERS if num in values), None)
+            gram = next((float(g) for _, g in portions(fdc_id)), None)
+            serving = next(iter(branded(fdc_id)), None)
+            yield {
+                "fdcId": fdc_id,
+                "description": description,
+                "dataType": data_type,
+                "publicationDate": publication_date,
+                "foodNutrients": [
+                    {"nutrientNumber": num, "nutrientName": "Energy" if num in ENERGY_NUMBERS else "", "value": v, "unitName": "KCAL" if num in ENERGY_NUMBERS else "G"}
+                    for num, v in values.items() if num == energy or num in MACRO_NUMBERS
+                ],
+                "servingSize": float(serving[1]) if serving and serving[1] else None,
+                "servingSizeUnit": (serving[2] or None) if serving else None,
+                "foodPortions": [{"gramWeight": gram}] if gram else [],
+            }
+
+
+def _external_sort(items, chunk_rows: int, tmp: str):
+    """Yield `(fdc_id, *str)` tuples in fdc_id order; ties keep their input order."""
+    runs = []
+    chunk = list(islice(items, chunk_rows))
+    while len(chunk) == chunk_rows:
+        runs.append(_spill(sorted(chunk, key=itemgetter(0)), tmp))
+        chunk = list(islice(items, chunk_rows))
+    chunk.sort(key=itemgetter(0))
+    if not runs:
+        yield from chunk
+        return
+    runs.append(_spill(chunk, tmp))
+    files = [open(path, newline="", encoding="utf-8") for path in runs]
+    try:
+        readers = [((int(row[0]), *row[1:]) for row in csv.reader(fp)) for fp in files]
+        yield from heapq.merge(*readers, key=itemgetter(0))
+    finally:
+        for fp in files:
+            fp.close()
+
+
+def _spill(rows, tmp: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=tmp)
+    with os.fdopen(fd, "w", newline="", encoding="utf-8") as fp:
+        csv.writer(fp).writerows(rows)
+    return path
+
+
+def _group_cursor(sorted_rows):
+    """Return a function giving the rows for each fdc_id, called with ascending fdc_ids."""
+    groups = groupby(sorted_rows, key=itemgetter(0))
+    current = next(groups, None)
+
+    def take(fdc_id: int) -> list:
+        nonlocal current
+        while current is not None and current[0] < fdc_id:
+            current = next(groups, None)
+        if current is None or current[0] != fdc_id:
+            return []
+        return list(current[1])
+
+    return take
+
+
+def iter_source(path: str):
+    if os.path.isdir(path):
+        yield from iter_csv_foods(path)
+    else:
+        for food in iter_json_foods(path):
+            yield _json_to_search_item(food)
+
+
+def to_row(item: dict) -> dict:
+    rec = FoodRecord.from_search_item(item)
+    calories = rec.calories_per_serving()
+    row = {
+        "fdc_id": int(item["fdcId"]),
+        "description": rec.name[:512],
+        "name_key": normalize_dish(rec.name)[:512],
+        "data_type": rec.data_type[:64],
+        "calories_per_serving": round(calories, 4) if calories is not None else None,
+        "energy": rec.energy,
+        "serving_size": rec.serving_size,
+        "serving_size_unit": (rec.serving_size_unit or "")[:32] or None,
+        "gram_weight": rec.gram_weight,
+        "protein": rec.protein,
+        "fat": rec.fat,
+        "carbohydrate": rec.carbohydrate,
+        "publication_date": item["publicationDate"][:32],
+    }
+    digest = hashlib.blake2b(digest_size=16)
+    for k, v in row.items():
+        if k not in ("fdc_id", "name_key"):
+            digest.update(repr(v).encode("utf-8"))
+    row["row_hash"] = digest.hexdigest()
+    return row
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from app.db import AsyncSessionLocal
+from app.repositories.meal_repo import MealRepository
+
+
+class MealLogWriter:
+    """Write-behind buffer for meal entries.
+
+    `add` only appends to an in-memory list; a background task writes the buffer with one
+    multi-row INSERT (plus the daily-total upserts) once `batch_size` entries are waiting
+    or every `flush_interval` seconds. At most `max_pending` entries are held; beyond that
+    new entries are dropped and counted. A failed batch is put back and retried on its own
+    on the next flush; after `max_attempts` failures its entries move to `dead_letters`
+    (bounded, newest kept) so one bad row can't hold up the rest of the history. Entries
+    still buffered when the process dies are lost.
+    """
+
+    logger = logging.getLogger("meal_calorie_app.MealLogWriter")
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, max_pending: int = 10_000,
+                 max_attempts: int = 5, session_factory=AsyncSessionLocal):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.session_factory = session_factory
+        self._buffer: list[dict] = []
+        # the failed batch at the head of the buffer and how often it has failed
+        self._retry_rows = 0
+        self._attempts = 0
+        self.dead_letters: deque[dict] = deque(maxlen=max_pending)
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._lock: asyncio.Lock | None = None
+        self._closing = False
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+
+    def add(self, user_id: int, result: dict):
+        """Buffer one /get-calories result for `user_id`."""
+        if len(self._buffer) >= self.max_pending:
+            self.dropped += 1
+            return
+        macros = result.get("macros_per_serving") or {}
+        servings = result["servings"]
+        self._buffer.append({
+            "user_id": user_id,
+            "dish_name": result["dish_name"][:255],
+            "fdc_id": result.get("fdc_id"),
+            "servings": servings,
+            "calories": result["total_calories"],
+            "protein_g": _scaled(macros.get("protein_g"), servings),
+            "fat_g": _scaled(macros.get("fat_g"), servings),
+            "carbohydrate_g": _scaled(macros.get("carbohydrate_g"), servings),
+            "logged_at": datetime.now(timezone.utc),
+        })
+        if len(self._buffer) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._buffer:
+                return 0
+            size = self._retry_rows or self.batch_size
+            rows, self._buffer = self._buffer[:size], self._buffer[size:]
+            try:
+                async with self.session_factory() as session:
+                    await MealRepository(session).add_entries(rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                self._attempts += 1
+                if self._attempts >= self.max_attempts:
+                    self.dead_letters.extend(rows)
+                    self.dead_lettered += len(rows)
+                    self._retry_rows = self._attempts = 0
+                    self.logger.error(
+                        "Meal log batch of %d entries failed %d times, moved to dead letters: %s",
+                        len(rows), self.max_attempts, e,
+                    )
+                    return 0
+                room = max(0, self.max_pending - len(self._buffer))
+                self.dropped += max(0, len(rows) - room)
+                self._buffer[:0] = rows[:room]
+                self._retry_rows = min(len(rows), room)
+                self.logger.warning("Meal log flush of %d entries failed: %s", len(rows), e)
+                return 0
+            self._retry_rows = self._attempts = 0
+            self.flushes += 1
+            self.written += len(rows)
+            return len(rows)
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                while await self.flush() and len(self._buffer) >= self.batch_size:
+                    pass
+            except Exception:
+                # the writer must outlive any one flush; the entries stay buffered
+                self.logger.exception("Meal log flush raised")
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            # let an in-progress flush finish instead of cancelling it mid-write
+            self._closing = True
+            self._wake.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._closing = False
+        # drain what is left; stop if the database keeps failing
+        while self._buffer and await self.flush():
+            pass
+
+    def stats(self):
+        return {
+            "pending": len(self._buffer),
+            "written": self.written,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+def _scaled(value, servings):
+    return round(value * servings, 2) if value is not None else None
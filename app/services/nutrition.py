@@ -0,0 +1,152 @@
+"""Compact nutrition records parsed from USDA FoodData Central search results."""
+from app.utils.metrics import STAGE_SECONDS
+try:
+    import orjson
+
+    def _loads(content):
+        return orjson.loads(content)
+except ImportError:  # pragma: no cover - orjson is optional
+    import json
+
+    def _loads(content):
+        return json.loads(content)
+
+ENERGY = "208"
+PROTEIN = "203"
+FAT = "204"
+CARBOHYDRATE = "205"
+_MACROS = {PROTEIN: "protein", FAT: "fat", CARBOHYDRATE: "carbohydrate"}
+# data types whose nutrient values we treat as already per serving
+_PER_SERVING_TYPES = ("branded", "survey", "foundation")
+
+
+class FoodRecord:
+    """The handful of fields we use from one FDC food, without the rest of the document."""
+
+    __slots__ = (
+        "fdc_id", "name", "data_type", "energy", "serving_size", "serving_size_unit",
+        "gram_weight", "protein", "fat", "carbohydrate", "source",
+    )
+
+    def __init__(self, fdc_id=None, name="", data_type="", energy=None, serving_size=None, serving_size_unit=None,
+                 gram_weight=None, protein=None, fat=None, carbohydrate=None, source="USDA FoodData Central"):
+        self.fdc_id = fdc_id
+        self.name = name
+        self.data_type = data_type
+        self.energy = energy
+        self.serving_size = serving_size
+        self.serving_size_unit = serving_size_unit
+        self.gram_weight = gram_weight
+        self.protein = protein
+        self.fat = fat
+        self.carbohydrate = carbohydrate
+        self.source = source
+
+    @classmethod
+    def from_search_item(cls, item: dict, source: str = "USDA FoodData Central"):
+        """Single pass over foodNutrients picking energy (kcal preferred) and the main macros."""
+        rec = cls(
+            fdc_id=item.get("fdcId"),
+            name=item.get("description") or item.get("lowercaseDescription") or "",
+            data_type=item.get("dataType") or "",
+            serving_size=item.get("servingSize"),
+            serving_size_unit=item.get("servingSizeUnit"),
+            source=source,
+        )
+        energy = None
+        energy_is_kcal = False
+        for n in item.get("foodNutrients") or ():
+            num = str(n.get("nutrientNumber") or n.get("nutrientId") or "")
+            value = n.get("value")
+            if value is None:
+                continue
+            macro = _MACROS.get(num)
+            if macro is not None:
+                if getattr(rec, macro) is None:
+                    setattr(rec, macro, float(value))
+                continue
+            if energy_is_kcal:
+                continue
+            if num == ENERGY or "energy" in (n.get("nutrientName") or "").lower():
+                unit = (n.get("unitName") or n.get("nutrientUnitName") or "").lower()
+                if energy is None or unit == "kcal":
+                    energy = value
+                    energy_is_kcal = unit == "kcal"
+        if energy is None:
+            for k, v in (item.get("labelNutrients") or {}).items():
+                if "energy" in k.lower() or "calor" in k.lower():
+                    energy = v.get("value") if isinstance(v, dict) else v
+                    break
+        rec.energy = float(energy) if energy is not None else None
+        for p in item.get("foodPortions") or ():
+            if p.get("gramWeight"):
+                rec.gram_weight = float(p["gramWeight"])
+                break
+        return rec
+
+    def per_serving_factor(self) -> float:
+        # nutrient values are per 100 g unless the data type or a serving size says otherwise
+        data_type = self.data_type.lower()
+        if any(t in data_type for t in _PER_SERVING_TYPES) or self.serving_size:
+            return 1.0
+        if self.gram_weight:
+            return self.gram_weight / 100.0
+        return 1.0
+
+    def calories_per_serving(self):
+        if self.energy is None:
+            return None
+        return self.energy * self.per_serving_factor()
+
+    def macros_per_serving(self) -> dict:
+        factor = self.per_serving_factor()
+        return {
+            f"{name}_g": round(value * factor, 2) if value is not None else None
+            for name, value in (("protein", self.protein), ("fat", self.fat), ("carbohydrate", self.carbohydrate))
+        }
+
+    def to_list(self) -> list:
+        return [getattr(self, f) for f in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+    def __eq__(self, other):
+        return isinstance(other, FoodRecord) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f"FoodRecord(fdc_id={self.fdc_id!r}, name={self.name!r}, energy={self.energy!r})"
+
+
+def parse_search_payload(content) -> list[FoodRecord]:
+    """Decode a /foods/search response body and keep only compact records."""
+    with STAGE_SECONDS.time("usda_decode"):
+        data = _loads(content)
+    with STAGE_SECONDS.time("usda_parse"):
+        return [FoodRecord.from_search_item(f) for f in data.get("foods") or ()]
+
+
+def _food_to_search_item(food: dict) -> dict:
+    # /foods returns nutrients as {"number", "name", "amount", "unitName"} (abridged) or with
+    # the names nested under "nutrient" (full); from_search_item reads the search-result shape
+    nutrients = []
+    for fn in food.get("foodNutrients") or ():
+        nutrient = fn.get("nutrient") or fn
+        nutrients.append({
+            "nutrientNumber": str(nutrient.get("number") or fn.get("nutrientNumber") or ""),
+            "nutrientName": nutrient.get("name") or fn.get("nutrientName") or "",
+            "value": fn.get("amount", fn.get("value")),
+            "unitName": nutrient.get("unitName") or "",
+        })
+    # prefer the classic 208 energy value over the Atwater variants
+    nutrients.sort(key=lambda n: n["nutrientNumber"] != "208")
+    return {**food, "foodNutrients": nutrients}
+
+
+def parse_foods_payload(content) -> list[FoodRecord]:
+    """Decode a multi-item /foods response body (a JSON list of foods)."""
+    with STAGE_SECONDS.time("usda_decode"):
+        data = _loads(content)
+    with STAGE_SECONDS.time("usda_parse"):
+        return [FoodRecord.from_search_item(_food_to_search_item(f)) for f in data or ()]
@@ -0,0 +1,110 @@
+"""Cache warm-start: snapshot the hottest dishes on shutdown and preload them on startup.
+
+Snapshot format (JSON): ``{"v": 1, "saved_at": ..., "dishes": [[dish_key, count, encoded], ...]}``
+where ``encoded`` is the `RecordCodec` string already used for the shared cache. A seed file is
+plain text with one dish name per line.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from app.db import AsyncSessionLocal
+from app.repositories.food_repo import FoodRepository
+from app.services.calories_service import WARMUP, CaloriesService, UpstreamUnavailable, normalize_dish, usda_priority
+from app.utils.codec import NOT_FOUND, RecordCodec
+
+SNAPSHOT_VERSION = 1
+logger = logging.getLogger("meal_calorie_app.warm_start")
+
+
+async def save_snapshot(path: str, records, limit: int, hot=None) -> int:
+    """Write the `limit` most requested dishes that have a cached record; returns how many."""
+    hot = CaloriesService.hot_dishes if hot is None else hot
+    dishes = []
+    for dish_key, count in hot.top(limit):
+        entry = await records.get_entry(dish_key)
+        if entry is None or entry[0] is NOT_FOUND:
+            continue
+        dishes.append([dish_key, count, RecordCodec.dumps(*entry)])
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump({"v": SNAPSHOT_VERSION, "saved_at": time.time(), "dishes": dishes}, fp, separators=(",", ":"))
+    os.replace(tmp, path)
+    return len(dishes)
+
+
+def load_snapshot(path: str) -> list:
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable cache snapshot %s: %s", path, e)
+        return []
+    if data.get("v") != SNAPSHOT_VERSION:
+        return []
+    return data.get("dishes") or []
+
+
+def load_seed_list(path: str) -> list[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as fp:
+            return [line.strip() for line in fp if line.strip() and not line.startswith("#")]
+    except OSError as e:
+        logger.warning("Could not read cache seed list %s: %s", path, e)
+        return []
+
+
+async def warm(usda, cache, records, snapshot: list, seeds: list[str], rate: float, hot=None) -> dict:
+    """Preload `records` from a snapshot, then resolve whatever is missing at most `rate` per second.
+
+    Snapshot records still within the hard TTL are stored as-is without any lookup; expired ones
+    and seed dishes go through `CaloriesService.lookup` (local index, then USDA).
+    """
+    hot = CaloriesService.hot_dishes if hot is None else hot
+    stats = {"restored": 0, "resolved": 0, "failed": 0}
+    pending = []
+    for dish_key, count, encoded in snapshot:
+        hot.add(dish_key, count)
+        entry = RecordCodec.loads(encoded)
+        if entry is not None and entry[0] is not NOT_FOUND and time.time() - entry[1] < records.hard_ttl:
+            await records.set(dish_key, entry[0], stored_at=entry[1])
+            stats["restored"] += 1
+        else:
+            pending.append(dish_key)
+    seen = set(pending) | {d[0] for d in snapshot}
+    for name in seeds:
+        if normalize_dish(name) not in seen:
+            seen.add(normalize_dish(name))
+            pending.append(name)
+
+    interval = 1.0 / rate if rate > 0 else 0
+    # USDA quota goes to user lookups first
+    token = usda_priority.set(WARMUP)
+    try:
+        for name in pending:
+            if await records.get_entry(normalize_dish(name)) is not None:
+                continue
+            try:
+                async with AsyncSessionLocal() as session:
+                    # warm-up lookups are not user demand: keep them out of the hot-dish counts
+                    # and out of the admission limit meant for requests
+                    service = CaloriesService(
+                        usda, cache, food_repo=FoodRepository(session), records=records, hot_dishes=None, admission=None
+                    )
+                    await service.lookup(name)
+                stats["resolved"] += 1
+            except UpstreamUnavailable:
+                logger.warning("USDA unavailable, stopping cache warm-up")
+                break
+            except Exception as e:
+                stats["failed"] += 1
+                logger.debug("Warm-up lookup for %s failed: %r", name, e)
+            await asyncio.sleep(interval)
+    finally:
+        usda_priority.reset(token)
+    logger.info("Cache warm-up done: %s", stats)
+    return stats
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class Overloaded(Exception):
+    """No capacity for this request; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Admission control: caps concurrent work at a limit that follows observed latency (AIMD).
+
+    Up to `limit` callers run at once. Others wait first come, first served in a queue of at
+    most `max_queue`, each for at most `queue_timeout` seconds; a full queue or an expired wait
+    raises Overloaded straight away. A completion faster than `target_latency` while the limit
+    is at least half used grows the limit by 1/limit (about +1 per round of requests). A
+    slower one, or one that raised one of `drop_on`, multiplies it by `backoff`, at most once
+    per `target_latency` and never below `min_limit`.
+    """
+
+    def __init__(self, name: str, initial_limit: int = 32, min_limit: int = 4, max_limit: int = 256,
+                 target_latency: float = 1.0, max_queue: int = 100, queue_timeout: float = 1.0,
+                 backoff: float = 0.9, drop_on: tuple = ()):
+        self.name = name
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.drop_on = drop_on
+        self._waiters: deque = deque()
+        self._latency = None  # moving average, for Retry-After
+        self._last_decrease = 0.0
+        self.inflight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.decreases = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._acquire()
+        start = time.monotonic()
+        failed = False
+        try:
+            yield
+        except self.drop_on:
+            failed = True
+            raise
+        finally:
+            self._record(time.monotonic() - start, failed)
+            self._release()
+
+    async def _acquire(self):
+        if self.inflight < self.limit and not self._waiters:
+            self.inflight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{self.name}: admission queue is full", self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(fut)
+            self.timed_out += 1
+            raise Overloaded(f"{self.name}: timed out waiting for admission", self.retry_after())
+        except asyncio.CancelledError:
+            self._abandon(fut)
+            raise
+        self.admitted += 1
+
+    def _abandon(self, fut):
+        if fut.done() and not fut.cancelled():
+            # granted just as the wait ended: hand the slot on
+            self._release()
+            return
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def _release(self):
+        self.inflight -= 1
+        while self._waiters and self.inflight < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.inflight += 1
+                fut.set_result(None)
+
+    def _record(self, latency: float, failed: bool):
+        self._latency = latency if self._latency is None else 0.9 * self._latency + 0.1 * latency
+        if failed or latency > self.target_latency:
+            now = time.monotonic()
+            # one cut per latency window, so a slow cohort finishing together counts once
+            if now - self._last_decrease >= self.target_latency:
+                self._last_decrease = now
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.decreases += 1
+        elif self.inflight * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def retry_after(self) -> float:
+        # roughly how long the work already admitted and queued takes to drain
+        per_round = self._latency or self.target_latency
+        return min(30.0, max(1.0, per_round * (len(self._waiters) + self.inflight) / self.limit))
+
+    def stats(self):
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "decreases": self.decreases,
+            "latency_avg": round(self._latency or 0.0, 4),
+        }
@@ -1,47 +1,306 @@
 import asyncio
+import sys
+import time
+from collections import OrderedDict
 from typing import Any
+from app.utils.codec import RecordCodec, NOT_FOUND
+from app.utils.metrics import CACHE_REQUESTS
+
+
+class LRUCache:
+    """Bounded, synchronous LRU with optional per-entry TTL. Not shared between workers."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        if self.maxsize <= 0:
+            return
+        ttl = ttl if ttl is not None else self.ttl
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RecordCache:
+    """Per-dish record cache: a bounded in-process L1 in front of the shared cache (L2).
+
+    Records are servings-independent. They are fresh for `ttl` seconds (the soft TTL) and
+    usable, but due for a background refresh, until `hard_ttl`. L2 keeps them for another
+    `stale_ttl` seconds so they can still be served while USDA is unavailable. "Not found"
+    results are cached for `negative_ttl`.
+    """
+
+    def __init__(self, l2=None, l1_size: int = 0, l1_ttl: float = 60, ttl: int = 86400, negative_ttl: int = 300,
+                 hard_ttl: int | None = None, stale_ttl: int = 0, codec=RecordCodec):
+        self.l2 = l2
+        self.l1 = LRUCache(l1_size, ttl=l1_ttl)
+        self.ttl = ttl
+        self.hard_ttl = max(ttl, hard_ttl or ttl)
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.codec = codec
+
+    @staticmethod
+    def _key(dish_key: str) -> str:
+        return f"calrec:{dish_key}"
+
+    def _usable(self, entry, allow_stale: bool):
+        if entry is None:
+            return None
+        record, stored_at = entry
+        if record is NOT_FOUND or allow_stale or time.time() - stored_at < self.hard_ttl:
+            return entry
+        return None
+
+    def needs_refresh(self, entry) -> bool:
+        """True once a usable record is past the soft TTL."""
+        record, stored_at = entry
+        return record is not NOT_FOUND and time.time() - stored_at >= self.ttl
+
+    def _remember(self, dish_key: str, entry):
+        ttl = min(self.l1.ttl or self.negative_ttl, self.negative_ttl) if entry[0] is NOT_FOUND else None
+        self.l1.set(dish_key, entry, ttl=ttl)
+
+    async def get_entry(self, dish_key: str, allow_stale: bool = False):
+        """`(record, stored_at)` if something usable is cached, else None. The record may be NOT_FOUND."""
+        entry = self._usable(self.l1.get(dish_key), allow_stale)
+        CACHE_REQUESTS.inc("l1", "miss" if entry is None else "hit")
+        if entry is not None or self.l2 is None:
+            return entry
+        entry = self.codec.loads(await self.l2.get(self._key(dish_key)))
+        CACHE_REQUESTS.inc("l2", "miss" if entry is None else "hit")
+        if entry is None:
+            return None
+        self._remember(dish_key, entry)
+        return self._usable(entry, allow_stale)
+
+    async def get(self, dish_key: str, allow_stale: bool = False):
+        """Returns the record, NOT_FOUND for a cached miss, or None when nothing usable is cached."""
+        entry = await self.get_entry(dish_key, allow_stale)
+        return entry[0] if entry is not None else None
+
+    async def get_many_entries(self, dish_keys: list[str]) -> dict:
+        """Usable entries for the given keys in one L2 round trip; keys with nothing usable are omitted."""
+        found = {}
+        missing = []
+        for key in dish_keys:
+            entry = self._usable(self.l1.get(key), False)
+            if entry is not None:
+                found[key] = entry
+            else:
+                missing.append(key)
+        CACHE_REQUESTS.inc("l1", "hit", amount=len(found))
+        CACHE_REQUESTS.inc("l1", "miss", amount=len(missing))
+        if missing and self.l2 is not None:
+            raws = await self.l2.mget([self._key(k) for k in missing])
+            for key, raw in zip(missing, raws):
+                entry = self.codec.loads(raw)
+                CACHE_REQUESTS.inc("l2", "miss" if entry is None else "hit")
+                if entry is None:
+                    continue
+                self._remember(key, entry)
+                entry = self._usable(entry, False)
+                if entry is not None:
+                    found[key] = entry
+        return found
+
+    async def get_many(self, dish_keys: list[str]) -> dict:
+        return {key: entry[0] for key, entry in (await self.get_many_entries(dish_keys)).items()}
+
+    async def set(self, dish_key: str, record, stored_at: float | None = None):
+        stored_at = time.time() if stored_at is None else stored_at
+        ex = self.negative_ttl if record is NOT_FOUND else self.hard_ttl + self.stale_ttl
+        self.l1.set(dish_key, (record, stored_at), ttl=min(self.l1.ttl or ex, ex))
+        if self.l2 is not None:
+            await self.l2.set(self._key(dish_key), self.codec.dumps(record, stored_at), ex=ex)
+
+    async def set_not_found(self, dish_key: str):
+        await self.set(dish_key, NOT_FOUND)
+
+
 class InMemoryCache:
-    def __init__(self):
-        self._store = {}
-        self._lock = asyncio.Lock()
+    """Bounded in-process cache exposing the subset of the Redis API the app uses.
+
+    Every call runs on the event loop thread and never awaits internally, so no lock is
+    needed. Keys are spread over shards, each an LRU with its share of the entry and byte
+    budget; a background sweeper expires one shard per tick.
+    """
+
+    def __init__(self, max_entries: int = 100_000, max_bytes: int | None = None, shards: int = 16, sweep_interval: float = 1.0):
+        self._shards = [OrderedDict() for _ in range(max(1, shards))]
+        self._shard_entries = max(1, max_entries // len(self._shards))
+        self._shard_bytes = max_bytes // len(self._shards) if max_bytes else None
+        self._bytes = [0] * len(self._shards)
+        self.sweep_interval = sweep_interval
+        self._sweeper: asyncio.Task | None = None
+        self._next_shard = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _shard(self, key: str) -> int:
+        return hash(key) % len(self._shards)
+
+    def _live(self, key: str):
+        """Return the live entry for key (refreshing its LRU position) or None."""
+        idx = self._shard(key)
+        shard = self._shards[idx]
+        entry = shard.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            self._remove(idx, key)
+            self.expirations += 1
+            return None
+        shard.move_to_end(key)
+        return entry
+
+    def _remove(self, idx: int, key: str):
+        entry = self._shards[idx].pop(key, None)
+        if entry is not None:
+            self._bytes[idx] -= entry[2]
+        return entry
+
+    def _store(self, key: str, value: Any, expires_at: float | None):
+        idx = self._shard(key)
+        shard = self._shards[idx]
+        self._remove(idx, key)
+        size = _sizeof(key) + _sizeof(value)
+        shard[key] = [value, expires_at, size]
+        self._bytes[idx] += size
+        while len(shard) > self._shard_entries or (self._shard_bytes and self._bytes[idx] > self._shard_bytes and len(shard) > 1):
+            old_key, old = shard.popitem(last=False)
+            self._bytes[idx] -= old[2]
+            self.evictions += 1
+
+    def _resize(self, key: str, entry):
+        idx = self._shard(key)
+        size = _sizeof(key) + _sizeof(entry[0])
+        self._bytes[idx] += size - entry[2]
+        entry[2] = size
 
     async def get(self, key: str):
-        async with self._lock:
-            item = self._store.get(key)
-            if not item:
-                return None
-            value, expires_at = item
-            if expires_at and expires_at < asyncio.get_event_loop().time():
-                del self._store[key]
-                return None
-            return value
-
-    async def set(self, key: str, value: Any, ex: int | None = None):
-        async with self._lock:
-            expires_at = None
-            if ex:
-                expires_at = asyncio.get_event_loop().time() + ex
-            self._store[key] = (value, expires_at)
+        entry = self._live(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    async def mget(self, keys):
+        return [await self.get(k) for k in keys]
+
+    async def set(self, key: str, value: Any, ex: int | None = None, nx: bool = False):
+        if nx and self._live(key) is not None:
+            return None
+        self._store(key, value, time.monotonic() + ex if ex else None)
+        return True
+
+    async def delete(self, key: str):
+        return 1 if self._remove(self._shard(key), key) is not None else 0
 
     async def zadd(self, key, mapping: dict):
-        # minimal: store list of timestamps
-        async with self._lock:
-            arr = self._store.get(key, ([], None))[0]
-            for v in mapping.values():
-                arr.append(v)
-            self._store[key] = (arr, None)
+        entry = self._live(key)
+        if entry is None or not isinstance(entry[0], dict):
+            self._store(key, dict(mapping), None)
+            return len(mapping)
+        added = sum(1 for m in mapping if m not in entry[0])
+        entry[0].update(mapping)
+        self._resize(key, entry)
+        return added
 
     async def zremrangebyscore(self, key, min_score, max_score):
-        async with self._lock:
-            arr = self._store.get(key, ([], None))[0]
-            arr = [x for x in arr if not (min_score <= x <= max_score)]
-            self._store[key] = (arr, None)
+        entry = self._live(key)
+        if entry is None:
+            return 0
+        members = entry[0]
+        keep = {m: s for m, s in members.items() if not (min_score <= s <= max_score)}
+        removed = len(members) - len(keep)
+        entry[0] = keep
+        self._resize(key, entry)
+        return removed
 
     async def zcard(self, key):
-        async with self._lock:
-            arr = self._store.get(key, ([], None))[0]
-            return len(arr)
+        entry = self._live(key)
+        return len(entry[0]) if entry is not None else 0
 
     async def expire(self, key, seconds):
+        entry = self._live(key)
+        if entry is None:
+            return False
+        entry[1] = time.monotonic() + seconds
         return True
 
+    def sweep(self, idx: int | None = None):
+        """Drop expired entries from one shard (round-robin when idx is None)."""
+        if idx is None:
+            idx = self._next_shard
+            self._next_shard = (idx + 1) % len(self._shards)
+        now = time.monotonic()
+        expired = [k for k, e in self._shards[idx].items() if e[1] is not None and e[1] <= now]
+        for k in expired:
+            self._remove(idx, k)
+        self.expirations += len(expired)
+        return len(expired)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval / len(self._shards))
+            self.sweep()
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "entries": sum(len(s) for s in self._shards),
+            "bytes": sum(self._bytes),
+        }
+
+
+def _sizeof(value) -> int:
+    """Cheap size estimate used for the byte budget, not an exact memory measurement."""
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    if isinstance(value, dict):
+        return 64 + sum(_sizeof(k) + 24 for k in value)
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
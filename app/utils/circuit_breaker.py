@@ -0,0 +1,55 @@
+import time
+
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Circuit breaker is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open after `failure_threshold` failures,
+    half-open after `reset_timeout` seconds, where one trial call decides whether to close again."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._trial_in_flight = False
+
+    def before_call(self):
+        """Raise CircuitOpen when calls should fail fast."""
+        if self.state == self.CLOSED:
+            return
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == self.OPEN and elapsed >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        raise CircuitOpen(max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.opened_count += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The trial call ended without a verdict (e.g. it was cancelled)."""
+        self._trial_in_flight = False
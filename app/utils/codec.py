@@ -0,0 +1,52 @@
+import json
+from app.services.nutrition import FoodRecord
+
+NOT_FOUND = object()
+
+# short codes keep the encoded records small; unknown sources are stored verbatim
+_SOURCES = {
+    "USDA FoodData Central": "u",
+    "USDA FoodData Central (local index)": "l",
+}
+_SOURCE_NAMES = {v: k for k, v in _SOURCES.items()}
+_NEGATIVE = "~"
+_VERSION = 3
+
+
+class RecordCodec:
+    """Compact string encoding of resolved FoodRecords for Redis / in-memory caches.
+
+    A record is stored as a positional JSON array `[version, stored_at, *FoodRecord fields]`
+    with the source shortened to a code, and a cached "not found" result as a single `~`.
+    `loads` returns `(record, stored_at)`.
+    """
+
+    @staticmethod
+    def dumps(record, stored_at: float = 0.0) -> str:
+        if record is NOT_FOUND:
+            return _NEGATIVE
+        values = record.to_list()
+        values[-1] = _SOURCES.get(values[-1], values[-1])
+        return json.dumps([_VERSION, round(stored_at, 1), *values], separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def loads(raw):
+        if raw is None:
+            return None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        if raw == _NEGATIVE:
+            return NOT_FOUND, 0.0
+        try:
+            version, stored_at, *values = json.loads(raw)
+        except (ValueError, TypeError):
+            return None
+        if version != _VERSION or len(values) != len(FoodRecord.__slots__):
+            return None
+        values[-1] = _SOURCE_NAMES.get(values[-1], values[-1])
+        return FoodRecord.from_list(values), stored_at
+
+    @classmethod
+    def loads_record(cls, raw):
+        entry = cls.loads(raw)
+        return entry[0] if entry is not None else None
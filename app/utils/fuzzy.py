@@ -1,5 +1,84 @@
-from rapidfuzz import fuzz, process
+from collections import defaultdict
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyMatcher:
+    """Candidates are preprocessed and indexed once, then scored against many queries.
+
+    Scoring uses WRatio like `process.extract`, but through one `process.cdist` call
+    (multi-threaded for large batches). For larger candidate sets a trigram prefilter
+    keeps only the candidates sharing the most trigrams with each query.
+    """
+
+    def __init__(self, candidates: list[str], prefilter_min: int = 64, max_candidates: int = 256, workers: int = -1):
+        self.candidates = list(candidates)
+        self._processed = [utils.default_process(c) for c in self.candidates]
+        self.prefilter_min = prefilter_min
+        self.max_candidates = max_candidates
+        self.workers = workers
+        self._index = None
+        if len(self.candidates) > prefilter_min:
+            self._index = defaultdict(list)
+            for i, text in enumerate(self._processed):
+                for gram in _trigrams(text):
+                    self._index[gram].append(i)
+
+    def _shortlist(self, query: str):
+        if self._index is None:
+            return None
+        counts = defaultdict(int)
+        for gram in _trigrams(query):
+            for i in self._index.get(gram, ()):
+                counts[i] += 1
+        if len(counts) > self.max_candidates:
+            return sorted(sorted(counts), key=counts.__getitem__, reverse=True)[:self.max_candidates]
+        return sorted(counts)
+
+    def match_many(self, queries: list[str], limit: int = 1, score_cutoff: float = 0):
+        """For each query, up to `limit` `(candidate, score, index)` tuples, best first."""
+        if not self.candidates or not queries:
+            return [[] for _ in queries]
+        processed = [utils.default_process(q) for q in queries]
+        shortlists = [self._shortlist(q) for q in processed]
+
+        if any(s is None for s in shortlists):
+            columns = list(range(len(self.candidates)))
+        else:
+            columns = sorted(set().union(*shortlists))
+        if not columns:
+            return [[] for _ in queries]
+
+        # threads only pay off once there is real work to split
+        workers = self.workers if len(processed) * len(columns) >= 10_000 else 1
+        scores = process.cdist(
+            processed, [self._processed[i] for i in columns], scorer=fuzz.WRatio, processor=None, workers=workers, dtype=np.float64
+        )
+
+        position = {c: j for j, c in enumerate(columns)}
+        results = []
+        for row, shortlist in zip(scores, shortlists):
+            if shortlist is not None and len(shortlist) != len(columns):
+                mask = np.full(len(columns), -1.0)
+                idx = [position[c] for c in shortlist]
+                mask[idx] = row[idx]
+                row = mask
+            order = np.argsort(-row, kind="stable")[:limit]
+            results.append([
+                (self.candidates[columns[j]], float(row[j]), columns[j])
+                for j in order if row[j] >= 0 and row[j] >= score_cutoff
+            ])
+        return results
+
+    def match(self, query: str, limit: int = 1, score_cutoff: float = 0):
+        return self.match_many([query], limit=limit, score_cutoff=score_cutoff)[0]
+
 
 def best_match(query: str, candidates: list[str], limit=1):
-    results = process.extract(query, candidates, scorer=fuzz.WRatio, limit=limit)
-    return results
+    # one query against a short list: building a FuzzyMatcher (and its index) costs more than it saves
+    return process.extract(query, candidates, scorer=fuzz.WRatio, processor=utils.default_process, limit=limit)
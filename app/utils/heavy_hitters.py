@@ -0,0 +1,44 @@
+import heapq
+
+
+class SpaceSaving:
+    """Approximate top-k counter (Space-Saving) holding at most `capacity` keys.
+
+    A new key arriving when the table is full replaces the key with the lowest count and
+    inherits that count, so frequent keys are never undercounted. The minimum is found
+    through a lazily updated heap, which is rebuilt when stale entries pile up.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._counts: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+
+    def add(self, key: str, count: int = 1):
+        if key in self._counts:
+            self._counts[key] += count
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = count
+        else:
+            floor = self._pop_min()
+            self._counts[key] = floor + count
+        heapq.heappush(self._heap, (self._counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, k) for k, c in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> int:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                del self._counts[key]
+                return count
+
+    def top(self, n: int | None = None) -> list[tuple[str, int]]:
+        return heapq.nlargest(n or len(self._counts), self._counts.items(), key=lambda kv: kv[1])
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, key):
+        return key in self._counts
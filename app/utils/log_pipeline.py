@@ -0,0 +1,116 @@
+"""Logging that never does I/O on the caller's thread.
+
+Records go through a bounded queue to a `QueueListener` thread that owns the real handlers
+(console, rotating file). When the queue is full the record is dropped and counted instead
+of blocking. Repetitive messages are rate-sampled per message key.
+"""
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through at most `burst` records per key every `interval` seconds.
+
+    The key is the logger name plus the unformatted message (so "Failed login attempt for
+    user: %s" is one key whatever the email), or `extra={"sample_key": ...}` when given.
+    Records at `max_level` and above are never sampled. The first record let through after
+    a suppressed run notes how many were dropped.
+    """
+
+    def __init__(self, burst: int = 10, interval: float = 60.0, max_level: int = logging.ERROR, max_keys: int = 1024):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_level = max_level
+        self.max_keys = max_keys
+        # key -> [window start, count in window, suppressed since last emitted]
+        self._windows: dict = {}
+        self.suppressed = 0
+
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno >= self.max_level:
+            return True
+        key = getattr(record, "sample_key", None) or (record.name, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None:
+            if len(self._windows) >= self.max_keys:
+                # dicts keep insertion order: forget the oldest key
+                self._windows.pop(next(iter(self._windows)))
+            window = self._windows[key] = [now, 0, 0]
+        elif now - window[0] >= self.interval:
+            window[0], window[1] = now, 0
+        if window[1] >= self.burst:
+            window[2] += 1
+            self.suppressed += 1
+            return False
+        window[1] += 1
+        if window[2]:
+            record.msg = f"{record.msg} ({window[2]} similar messages suppressed)"
+            window[2] = 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class LogPipeline:
+    def __init__(self, handler: DroppingQueueHandler, listener: QueueListener, sampler: SamplingFilter):
+        self.handler = handler
+        self.listener = listener
+        self.sampler = sampler
+
+    def stats(self):
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed": self.sampler.suppressed,
+        }
+
+    def stop(self):
+        self.listener.stop()
+
+
+def setup_logging(logger: logging.Logger, handlers: list[logging.Handler], formatter: logging.Formatter,
+                  filters=(), queue_size: int = 10_000, sample_burst: int = 10, sample_interval: float = 60.0) -> LogPipeline:
+    """Route `logger` through a bounded queue to `handlers` on a background thread.
+
+    `filters` run on the caller's side, before the record is queued (e.g. to capture
+    context variables such as the request ID).
+    """
+    for h in handlers:
+        h.setFormatter(formatter)
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    sampler = SamplingFilter(sample_burst, sample_interval)
+    for f in (*filters, sampler):
+        handler.addFilter(f)
+    listener = QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    logger.addHandler(handler)
+    return LogPipeline(handler, listener, sampler)
@@ -0,0 +1,158 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Recording is a dict lookup plus an integer/float add on the event loop thread, with no
+locks; rendering walks the current values. Values are per worker process.
+"""
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in list(self._values.items()):
+            yield self.name, _labels(self.labelnames, labels), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # per label set: one count per bucket plus +Inf, then sum
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def count(self, *labels) -> int:
+        state = self._values.get(labels)
+        return sum(state[:-1]) if state else 0
+
+    def samples(self):
+        for labels, state in list(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), state):
+                cumulative += n
+                yield f"{self.name}_bucket", _labels(self.labelnames + ("le",), labels + (bound,)), cumulative
+            yield f"{self.name}_sum", _labels(self.labelnames, labels), state[-1]
+            yield f"{self.name}_count", _labels(self.labelnames, labels), cumulative
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "start")
+
+    def __init__(self, hist: Histogram, labels: tuple):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class StatsGauge:
+    """Exposes the numeric values of a component's `stats()` dict as gauges, read at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, stats):
+        self.name = name
+        self.help = help
+        self.stats = stats
+
+    def samples(self):
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            yield self.name, _labels(("stat",), (key,)), value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, object] = {}
+
+    def register(self, metric):
+        # replacing by name keeps repeated app startups (tests, reloads) from duplicating series
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def stats_gauge(self, name: str, help: str, stats) -> StatsGauge:
+        return self.register(StatsGauge(name, help, stats))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "meal_stage_seconds", "Latency of individual request stages", ("stage",)
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "meal_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+CACHE_REQUESTS = registry.counter(
+    "meal_cache_requests_total", "Calorie record cache lookups by layer and result", ("layer", "result")
+)
+USDA_RESPONSES = registry.counter(
+    "meal_usda_responses_total", "USDA API responses by HTTP status (or 'error' for transport failures)", ("status",)
+)
+RATE_LIMIT_DECISIONS = registry.counter(
+    "meal_rate_limit_decisions_total", "Rate limiter decisions by limiter", ("limiter", "result")
+)
+BCRYPT_SECONDS = registry.histogram(
+    "meal_bcrypt_seconds", "bcrypt hash/verify time including pool queueing", ("op",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0),
+)
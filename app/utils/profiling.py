@@ -0,0 +1,162 @@
+"""Opt-in cProfile dumps of single requests.
+
+A request is profiled when it carries `X-Profile: <token>` or is picked at random
+(`sample_rate`). cProfile hooks the whole thread, so the profile covers everything the event
+loop ran while the request was in flight: its own coroutine steps (CaloriesService,
+AuthService, parsing, matching) and any other request interleaved with it. Work on other
+threads (bcrypt, SQLite) only shows up as time the request waited. Only one request is
+profiled at a time.
+
+Each profile is a pstats file (`snakeviz`, `flameprof` or `python -m pstats` read it) with a
+JSON sidecar holding the request, its duration and the top functions. The directory keeps
+the newest `max_files` profiles.
+"""
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import time
+from app.utils.request_context import request_id_var
+
+_VALID_NAME = re.compile(r"^[0-9]+-[A-Za-z0-9_-]{1,64}$")
+
+
+class ProfileStore:
+    def __init__(self, path: str, max_files: int = 50, top: int = 15):
+        self.path = path
+        self.max_files = max_files
+        self.top = top
+        self.saved = 0
+        self.failed = 0
+        self.skipped_busy = 0
+
+    async def save(self, name: str, profiler: cProfile.Profile, meta: dict):
+        # pstats formatting and file writes stay off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._write, name, profiler, meta)
+
+    def _write(self, name: str, profiler: cProfile.Profile, meta: dict):
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            stats = pstats.Stats(profiler)
+            base = os.path.join(self.path, name)
+            stats.dump_stats(base + ".prof.tmp")
+            os.replace(base + ".prof.tmp", base + ".prof")
+            top = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:self.top]
+            meta["top"] = [
+                {"function": pstats.func_std_string(func), "calls": nc, "tottime": round(tt, 6), "cumtime": round(ct, 6)}
+                for func, (_, nc, tt, ct, _) in top
+            ]
+            with open(base + ".json", "w", encoding="utf-8") as fp:
+                json.dump(meta, fp)
+        except OSError:
+            self.failed += 1
+            return
+        self.saved += 1
+        self._prune()
+
+    def _names(self) -> list[str]:
+        try:
+            files = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        names = [f[:-5] for f in files if f.endswith(".prof") and _VALID_NAME.match(f[:-5])]
+        # names start with a millisecond timestamp, so this is newest first
+        return sorted(names, key=lambda n: int(n.split("-", 1)[0]), reverse=True)
+
+    def _prune(self):
+        for name in self._names()[self.max_files:]:
+            for ext in (".prof", ".json"):
+                try:
+                    os.remove(os.path.join(self.path, name + ext))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        profiles = []
+        for name in self._names()[:limit]:
+            try:
+                with open(os.path.join(self.path, name + ".json"), "r", encoding="utf-8") as fp:
+                    meta = json.load(fp)
+            except (OSError, ValueError):
+                meta = {}
+            profiles.append({"id": name, **meta})
+        return profiles
+
+    def file_for(self, name: str) -> str | None:
+        if not _VALID_NAME.match(name):
+            return None
+        path = os.path.join(self.path, name + ".prof")
+        return path if os.path.isfile(path) else None
+
+    def stats(self):
+        return {"saved": self.saved, "failed": self.failed, "skipped_busy": self.skipped_busy, "files": len(self._names())}
+
+
+class ProfilingMiddleware:
+    """Profiles requests sent with a valid X-Profile token, or a random `sample_rate` of them.
+
+    Must sit inside RequestContextMiddleware so profiles are named after the request ID.
+    Profiled responses get an `X-Profile-Id` header.
+    """
+
+    header = b"x-profile"
+
+    def __init__(self, app, store: ProfileStore, token: str = "", sample_rate: float = 0.0):
+        self.app = app
+        self.store = store
+        self.token = token.encode("latin-1")
+        self.sample_rate = sample_rate
+        self.busy = False
+
+    def _wanted(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if self.token:
+            for name, value in scope.get("headers") or ():
+                if name == self.header:
+                    return hmac.compare_digest(value, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        if self.busy:
+            # one cProfile per thread: a second profiler would replace the first
+            self.store.skipped_busy += 1
+            await self.app(scope, receive, send)
+            return
+        name = f"{int(time.time() * 1000)}-{re.sub(r'[^A-Za-z0-9_-]', '_', request_id_var.get())[:64]}"
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers") or ()) + [(b"x-profile-id", name.encode("latin-1"))]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        self.busy = True
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            self.busy = False
+            route = scope.get("route")
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 3),
+                "created_at": time.time(),
+            }
+            await self.store.save(name, profiler, meta)
@@ -1,33 +1,104 @@
+import math
 import time
+import weakref
+from typing import NamedTuple
 from app.config import settings
+from app.utils.cache import InMemoryCache
+from app.utils.metrics import RATE_LIMIT_DECISIONS, STAGE_SECONDS
+
+# GCRA: the key stores the "theoretical arrival time" (TAT) of the next request. One
+# atomic script call per decision; TIME is read inside Redis so workers share one clock.
+GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local period = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + cost * period
+local allow_at = new_tat - window
+if now < allow_at then
+  return {0, tostring(tat - now), tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat - now), '0'}
+"""
+
+_scripts = weakref.WeakKeyDictionary()
+# used when no cache has been configured yet (e.g. tests without app startup)
+_fallback_cache = InMemoryCache(max_entries=10_000)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+    def headers(self) -> dict:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
 
 class RateLimiter:
-    def __init__(self, cache):
-        self.cache = cache
-        self.limit = int(settings.RATE_LIMIT)
-        self.window = int(settings.RATE_LIMIT_WINDOW)
+    def __init__(self, cache, limit: int | None = None, window: int | None = None, name: str = "rate_limit"):
+        self.cache = cache if cache is not None else _fallback_cache
+        # stage and limiter label in the metrics, so other budgets don't count as client rate limiting
+        self.name = name
+        self.limit = int(limit or settings.RATE_LIMIT)
+        self.window = int(window or settings.RATE_LIMIT_WINDOW)
+        self.period = self.window / self.limit
 
     async def is_allowed(self, key: str) -> bool:
-        now = int(time.time())
-        window_start = now - self.window
-        zkey = f"rl:{key}"
-        
-        try:
-            await self.cache.zremrangebyscore(zkey, 0, window_start)
-            current = await self.cache.zcard(zkey)
-        except AttributeError:
-            
-            cur = await self.cache.get(zkey) or []
-            cur = [t for t in cur if t >= window_start]
-            current = len(cur)
-            if current >= self.limit:
-                return False
-            cur.append(now)
-            await self.cache.set(zkey, cur, ex=self.window+1)
-            return True
-
-        if current >= self.limit:
-            return False
-        await self.cache.zadd(zkey, {str(now): now})
-        await self.cache.expire(zkey, self.window + 1)
-        return True
+        return (await self.hit(key)).allowed
+
+    async def hit(self, key: str, cost: int = 1) -> RateLimitResult:
+        # new prefix: the old sliding-window limiter stored sorted sets under rl:*
+        zkey = f"rlg:{key}"
+        with STAGE_SECONDS.time(self.name):
+            if hasattr(self.cache, "register_script"):
+                allowed, reset_after, retry_after = await self._hit_redis(zkey, cost)
+            elif hasattr(self.cache, "transact"):
+                allowed, reset_after, retry_after = await self._hit_shared(zkey, cost)
+            else:
+                allowed, reset_after, retry_after = await self._hit_local(zkey, cost)
+        RATE_LIMIT_DECISIONS.inc(self.name, "allowed" if allowed else "rejected")
+        remaining = max(0, int((self.window - reset_after) / self.period))
+        return RateLimitResult(allowed, self.limit, remaining, reset_after, retry_after)
+
+    async def _hit_redis(self, zkey: str, cost: int):
+        script = _scripts.get(self.cache)
+        if script is None:
+            script = _scripts[self.cache] = self.cache.register_script(GCRA_LUA)
+        allowed, reset_after, retry_after = await script(keys=[zkey], args=[self.period, self.window, cost])
+        return bool(int(allowed)), float(reset_after), float(retry_after)
+
+    def _gcra(self, stored, now: float, cost: int):
+        """Same decision as GCRA_LUA: `(new stored value or None, ttl, (allowed, reset_after, retry_after))`."""
+        tat = max(float(stored), now) if stored else now
+        new_tat = tat + cost * self.period
+        allow_at = new_tat - self.window
+        if now < allow_at:
+            return None, None, (False, tat - now, allow_at - now)
+        return repr(new_tat), math.ceil(new_tat - now), (True, new_tat - now, 0.0)
+
+    async def _hit_shared(self, zkey: str, cost: int):
+        # read and update under the key's bucket lock, so workers can't both take the last token
+        now = time.time()
+        return await self.cache.transact(zkey, lambda stored: self._gcra(stored, now, cost))
+
+    async def _hit_local(self, zkey: str, cost: int):
+        # get and set run back to back without suspending, so this is atomic on the event loop
+        now = time.time()
+        value, ex, result = self._gcra(await self.cache.get(zkey), now, cost)
+        if value is not None:
+            await self.cache.set(zkey, value, ex=ex)
+        return result
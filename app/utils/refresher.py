@@ -0,0 +1,69 @@
+import asyncio
+import logging
+
+
+class BackgroundRefresher:
+    """Runs deduplicated background refreshes with a concurrency cap.
+
+    At most one refresh per key is pending; tasks are tracked so `close()` can cancel them
+    on shutdown. When `max_pending` refreshes are queued, new ones are dropped.
+    """
+
+    logger = logging.getLogger("meal_calorie_app.BackgroundRefresher")
+
+    def __init__(self, max_concurrency: int = 4, max_pending: int = 256):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self._sem: asyncio.Semaphore | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.stale_served = 0
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def schedule(self, key: str, fn) -> bool:
+        if key in self._tasks:
+            self.deduplicated += 1
+            return False
+        if len(self._tasks) >= self.max_pending:
+            self.dropped += 1
+            return False
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        self.scheduled += 1
+        self._tasks[key] = asyncio.get_running_loop().create_task(self._run(key, fn))
+        return True
+
+    async def _run(self, key: str, fn):
+        try:
+            async with self._sem:
+                await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            self.logger.warning("Background refresh of %s failed: %r", key, e)
+        finally:
+            self._tasks.pop(key, None)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def stats(self):
+        return {
+            "stale_served": self.stale_served,
+            "scheduled": self.scheduled,
+            "deduplicated": self.deduplicated,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self.pending,
+        }
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
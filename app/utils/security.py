@@ -3,7 +3,7 @@
 from jose import jwt
 from app.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 ALGORITHM = "HS256"
 
 def _safe_truncate_password(password: str) -> str:
@@ -26,9 +26,23 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     plain_password = _safe_truncate_password(plain_password)
     return pwd_context.verify(plain_password, hashed_password)
 
+def needs_rehash(hashed_password: str) -> bool:
+    if pwd_context.needs_update(hashed_password):
+        return True
+    # $2b$12$... - passlib only flags rounds outside min/max, we want the configured cost exactly
+    try:
+        return int(hashed_password.split("$")[2]) != settings.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 
 def create_access_token(data: dict, expires_delta: int | None = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=expires_delta or settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify signature and expiry; raises jose.JWTError for invalid tokens."""
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
@@ -0,0 +1,223 @@
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+_MAGIC = b"MCSHM001"
+# magic, buckets, ways, slot size
+_HEADER = struct.Struct("<8sIII")
+_HEADER_SIZE = 64
+# key hash, expires at (0 = never), last access, key length, value length, kind
+_SLOT = struct.Struct("<QddHIB")
+_EMPTY, _STR, _BYTES = 0, 1, 2
+# returned by a `transact` fn as the new value to remove the key
+DELETE = object()
+
+
+def _hash(key: bytes) -> int:
+    # Python's hash() is randomized per process, workers need a stable one
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class SharedMemoryCache:
+    """Cache shared by every worker process on the host, backed by a memory-mapped file.
+
+    The file holds a fixed-size hash table: `buckets` buckets of `ways` fixed-size slots.
+    A key lives in the bucket picked by a stable hash; inside a full bucket the least
+    recently used slot is replaced. Each operation holds an fcntl lock on its bucket's byte
+    range only, so workers touching different keys don't contend. Locks are held for a few
+    microseconds and taken from the event loop thread (fcntl locks are per process, not per
+    thread). Values must be str or bytes; values that don't fit in a slot are not stored.
+    """
+
+    def __init__(self, path: str, slots: int = 65536, slot_size: int = 512, ways: int = 8):
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryCache needs fcntl (POSIX only)")
+        self.path = path
+        self.ways = ways
+        self.buckets = max(1, slots // ways)
+        self.slot_size = slot_size
+        self.bucket_size = ways * slot_size
+        self.capacity = slot_size - _SLOT.size
+        size = _HEADER_SIZE + self.buckets * self.bucket_size
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+            try:
+                header = os.pread(self._fd, _HEADER.size, 0)
+                expected = _HEADER.pack(_MAGIC, self.buckets, ways, slot_size)
+                if header[:8] != _MAGIC:
+                    # new file (or not ours): size it and write the header; pages start zeroed
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, size)
+                    os.pwrite(self._fd, expected, 0)
+                elif header != expected:
+                    # resizing under processes that still map the file would crash them
+                    raise ValueError(f"{path} was created with a different table layout; remove it to resize")
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+            self._mm = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.oversize = 0
+
+    def _locate(self, key: str):
+        raw = key.encode("utf-8")
+        h = _hash(raw)
+        return raw, h, _HEADER_SIZE + (h % self.buckets) * self.bucket_size
+
+    def _lock(self, base: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.bucket_size, base)
+
+    def _unlock(self, base: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, self.bucket_size, base)
+
+    def _find(self, raw: bytes, h: int, base: int, now: float):
+        """Offset of the live slot holding key, or None. Expired slots met on the way are freed."""
+        for i in range(self.ways):
+            off = base + i * self.slot_size
+            slot_hash, expires_at, _, key_len, _, kind = _SLOT.unpack_from(self._mm, off)
+            if kind == _EMPTY:
+                continue
+            if expires_at and expires_at <= now:
+                self._mm[off + _SLOT.size - 1] = _EMPTY
+                self.expirations += 1
+                continue
+            start = off + _SLOT.size
+            if slot_hash == h and self._mm[start:start + key_len] == raw:
+                return off
+        return None
+
+    def _read(self, off: int, now: float):
+        slot_hash, expires_at, _, key_len, val_len, kind = _SLOT.unpack_from(self._mm, off)
+        _SLOT.pack_into(self._mm, off, slot_hash, expires_at, now, key_len, val_len, kind)
+        start = off + _SLOT.size + key_len
+        value = self._mm[start:start + val_len]
+        return value.decode("utf-8") if kind == _STR else value
+
+    def _write(self, raw: bytes, h: int, base: int, value, expires_at: float, now: float, existing):
+        if isinstance(value, str):
+            data, kind = value.encode("utf-8"), _STR
+        elif isinstance(value, (bytes, bytearray)):
+            data, kind = bytes(value), _BYTES
+        else:
+            raise TypeError(f"SharedMemoryCache stores str or bytes, not {type(value).__name__}")
+        if len(raw) + len(data) > self.capacity:
+            self.oversize += 1
+            if existing is not None:
+                self._mm[existing + _SLOT.size - 1] = _EMPTY
+            return False
+        off = existing
+        if off is None:
+            oldest = None
+            for i in range(self.ways):
+                slot = base + i * self.slot_size
+                kind_at, touched = self._mm[slot + _SLOT.size - 1], _SLOT.unpack_from(self._mm, slot)[2]
+                if kind_at == _EMPTY:
+                    off = slot
+                    break
+                if oldest is None or touched < oldest[0]:
+                    oldest = (touched, slot)
+            if off is None:
+                off = oldest[1]
+                self.evictions += 1
+        start = off + _SLOT.size
+        self._mm[start:start + len(raw)] = raw
+        self._mm[start + len(raw):start + len(raw) + len(data)] = data
+        _SLOT.pack_into(self._mm, off, h, expires_at, now, len(raw), len(data), kind)
+        return True
+
+    def _get(self, key: str):
+        raw, h, base = self._locate(key)
+        now = time.time()
+        self._lock(base)
+        try:
+            off = self._find(raw, h, base, now)
+            value = self._read(off, now) if off is not None else None
+        finally:
+            self._unlock(base)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def get(self, key: str):
+        return self._get(key)
+
+    async def mget(self, keys):
+        return [self._get(k) for k in keys]
+
+    async def set(self, key: str, value, ex: int | None = None, nx: bool = False):
+        raw, h, base = self._locate(key)
+        now = time.time()
+        self._lock(base)
+        try:
+            existing = self._find(raw, h, base, now)
+            if nx and existing is not None:
+                return None
+            return self._write(raw, h, base, value, now + ex if ex else 0.0, now, existing) or None
+        finally:
+            self._unlock(base)
+
+    async def delete(self, key: str):
+        raw, h, base = self._locate(key)
+        self._lock(base)
+        try:
+            off = self._find(raw, h, base, time.time())
+            if off is None:
+                return 0
+            self._mm[off + _SLOT.size - 1] = _EMPTY
+            return 1
+        finally:
+            self._unlock(base)
+
+    async def transact(self, key: str, fn):
+        """Atomically read-modify-write one key across processes.
+
+        `fn(current_value_or_None)` returns `(new_value, ex, result)`; `new_value` None keeps
+        the stored value and DELETE removes it. Returns `result`.
+        """
+        raw, h, base = self._locate(key)
+        now = time.time()
+        self._lock(base)
+        try:
+            off = self._find(raw, h, base, now)
+            value, ex, result = fn(self._read(off, now) if off is not None else None)
+            if value is DELETE:
+                if off is not None:
+                    self._mm[off + _SLOT.size - 1] = _EMPTY
+            elif value is not None:
+                self._write(raw, h, base, value, now + ex if ex else 0.0, now, off)
+            return result
+        finally:
+            self._unlock(base)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "oversize": self.oversize,
+            "slots": self.buckets * self.ways,
+        }
+
+    async def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+            self._mm = None
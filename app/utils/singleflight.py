@@ -0,0 +1,114 @@
+import asyncio
+import json
+import uuid
+import weakref
+from app.utils.shm_cache import DELETE
+
+# deletes the lock only while it still holds our token: a leader whose lock expired must not
+# release the lock another worker has taken since
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_scripts = weakref.WeakKeyDictionary()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    In-process callers share a future. When a shared cache is passed to `do`,
+    the leader also takes a short-lived lock key so callers in other workers
+    wait for the published result instead of repeating the work.
+    """
+
+    def __init__(self, lock_ttl: float = 10.0, poll_interval: float = 0.05, dumps=json.dumps, loads=json.loads):
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.dumps = dumps
+        self.loads = loads
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.remote_coalesced = 0
+
+    def stats(self):
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "remote_coalesced": self.remote_coalesced,
+            "inflight": len(self._inflight),
+        }
+
+    async def do(self, key: str, fn, cache=None):
+        while (fut := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # only the leader was cancelled: go again, and the first follower back leads
+                if not fut.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            if cache is not None:
+                result = await self._do_shared(key, fn, cache)
+            else:
+                self.leaders += 1
+                result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # mark retrieved so a leader without followers doesn't log a warning
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _do_shared(self, key: str, fn, cache):
+        lock_key = f"sf:lock:{key}"
+        result_key = f"sf:res:{key}"
+        token = uuid.uuid4().hex
+        ttl = max(1, int(self.lock_ttl))
+
+        if not await cache.set(lock_key, token, ex=ttl, nx=True):
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.lock_ttl
+            while loop.time() < deadline:
+                raw = await cache.get(result_key)
+                if raw:
+                    self.remote_coalesced += 1
+                    return self.loads(raw)
+                if not await cache.get(lock_key):
+                    break
+                await asyncio.sleep(self.poll_interval)
+            # the remote leader failed or timed out, do the work ourselves
+
+        self.leaders += 1
+        try:
+            result = await fn()
+            await cache.set(result_key, self.dumps(result), ex=ttl)
+            return result
+        finally:
+            await self._release(cache, lock_key, token)
+
+    async def _release(self, cache, lock_key: str, token: str):
+        if hasattr(cache, "register_script"):
+            script = _scripts.get(cache)
+            if script is None:
+                script = _scripts[cache] = cache.register_script(RELEASE_LUA)
+            await script(keys=[lock_key], args=[token])
+        elif hasattr(cache, "transact"):
+            await cache.transact(lock_key, lambda held: (DELETE if held == token else None, None, None))
+        elif await cache.get(lock_key) == token:
+            # get and delete run back to back without suspending, so this is atomic on the event loop
+            await cache.delete(lock_key)
@@ -0,0 +1,164 @@
+import heapq
+import math
+import random
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import islice
+from app.utils.fuzzy import _trigrams
+
+
+class SuggestIndex:
+    """Bounded in-memory autocomplete over normalized dish names.
+
+    Word-prefix matches come from a sorted list of distinct tokens searched with bisect. Each
+    token keeps its names ordered by popularity, so the most popular matches are read first
+    however many names share a word. When those run short, a trigram index finds near misses
+    (typos). Results are ranked by match quality scaled by log popularity. Once more than
+    `max_entries` names are held, each add evicts the least popular of `evict_samples`
+    randomly sampled names, so no single add pays for a bulk eviction.
+    """
+
+    def __init__(self, max_entries: int = 20_000, max_scan: int = 256, evict_samples: int = 16):
+        self.max_entries = max_entries
+        self.max_scan = max_scan
+        self.evict_samples = evict_samples
+        # key -> [popularity, matched item name, trigram count, position in _keys]
+        self._entries: dict[str, list] = {}
+        # every key once, for sampling eviction candidates
+        self._keys: list[str] = []
+        self._tokens: list[str] = []
+        # token -> keys containing it, most popular first
+        self._postings: dict[str, list[str]] = {}
+        self._trigrams: dict[str, set] = defaultdict(set)
+        self._rng = random.Random()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _popularity(self, key: str) -> int:
+        return -self._entries[key][0]
+
+    def add(self, key: str, matched_item: str | None = None, count: int = 1):
+        """Record `key` (already normalized) as a known dish, `count` more times popular."""
+        if not key:
+            return
+        entry = self._entries.get(key)
+        if entry is not None:
+            if matched_item:
+                entry[1] = matched_item
+            if count:
+                entry[0] += count
+                for token in set(key.split()):
+                    self._promote(self._postings[token], key)
+            return
+        grams = _trigrams(key)
+        self._entries[key] = [count, matched_item, len(grams), len(self._keys)]
+        self._keys.append(key)
+        for token in set(key.split()):
+            keys = self._postings.get(token)
+            if keys is None:
+                keys = self._postings[token] = []
+                self._tokens.insert(bisect_left(self._tokens, token), token)
+            # after the names that are at least as popular
+            keys.insert(bisect_right(keys, -count, key=self._popularity), key)
+        for gram in grams:
+            self._trigrams[gram].add(key)
+        while len(self._entries) > self.max_entries:
+            self._evict_one()
+
+    def _promote(self, keys: list[str], key: str):
+        i = keys.index(key)
+        j = bisect_left(keys, self._popularity(key), hi=i, key=self._popularity)
+        if j < i:
+            del keys[i]
+            keys.insert(j, key)
+
+    def _evict_one(self):
+        sample = (self._keys[self._rng.randrange(len(self._keys))] for _ in range(self.evict_samples))
+        self._remove(min(sample, key=lambda k: self._entries[k][0]))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        # swap the last key into the freed slot
+        last = self._keys.pop()
+        if last != key:
+            self._keys[entry[3]] = last
+            self._entries[last][3] = entry[3]
+        for token in set(key.split()):
+            keys = self._postings[token]
+            keys.remove(key)
+            if not keys:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+        for gram in _trigrams(key):
+            keys = self._trigrams.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._trigrams[gram]
+
+    def _prefix_matches(self, query: str, limit: int) -> dict:
+        words = query.split()
+        # the longest word is usually the most selective one to scan by
+        anchor = max(words, key=len)
+        lo = bisect_left(self._tokens, anchor)
+        hi = bisect_left(self._tokens, anchor + "\U0010ffff", lo)
+        tokens = self._tokens[lo:hi]
+        if len(tokens) > self.max_scan:
+            # the max_scan most popular names all sit under these tokens
+            tokens = heapq.nsmallest(self.max_scan, tokens, key=lambda t: self._popularity(self._postings[t][0]))
+        candidates = heapq.merge(*(self._postings[t] for t in tokens), key=self._popularity)
+        found = {}
+        top = 0
+        for key in islice(candidates, self.max_scan):
+            if key in found:
+                continue
+            if key.startswith(query):
+                found[key] = 1.0
+                top += 1
+                # later names are no more popular, so none of them can outrank these
+                if top >= limit:
+                    break
+                continue
+            key_words = key.split()
+            if all(any(kw.startswith(w) for kw in key_words) for w in words):
+                found[key] = 0.8
+        return found
+
+    def _fuzzy_matches(self, query: str) -> dict:
+        grams = _trigrams(query)
+        postings = sorted((self._trigrams[g] for g in grams if g in self._trigrams), key=len)
+        counts = defaultdict(int)
+        visited = 0
+        # rare trigrams first; stop once enough postings were read
+        for keys in postings:
+            if visited + len(keys) > self.max_scan * 2:
+                break
+            visited += len(keys)
+            for key in keys:
+                counts[key] += 1
+        found = {}
+        for key, shared in counts.items():
+            dice = 2 * shared / (len(grams) + self._entries[key][2])
+            if dice >= 0.4:
+                found[key] = 0.7 * dice
+        return found
+
+    def suggest(self, query: str, limit: int = 10) -> list[dict]:
+        if not query or not self._entries:
+            return []
+        matches = self._prefix_matches(query, limit)
+        if len(matches) < limit:
+            for key, quality in self._fuzzy_matches(query).items():
+                matches.setdefault(key, quality)
+        scored = []
+        for key, quality in matches.items():
+            popularity, matched_item = self._entries[key][:2]
+            scored.append((quality * (1 + math.log1p(popularity)), popularity, key, matched_item))
+        return [
+            {"dish_name": key, "matched_item": matched_item, "popularity": popularity, "score": round(score, 3)}
+            for score, popularity, key, matched_item in heapq.nlargest(limit, scored)
+        ]
+
+    def stats(self):
+        return {"entries": len(self._entries), "tokens": len(self._tokens), "trigrams": len(self._trigrams)}
@@ -0,0 +1,240 @@
+# Load and micro benchmarks against the ASGI app, with USDA replaced by benchmarks/usda_stub.py.
+# Usage: python -m benchmarks.run [--only get_calories,auth_login,...] [--requests 500] [--concurrency 16]
+#                                 [--usda-latency 0.05] [--error-rate 0.0] [--save out.json] [--baseline base.json]
+# With --baseline, exits 1 when a scenario's p95 or throughput is worse than the baseline by more than --tolerance.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+HTTP_SCENARIOS = ("get_calories", "auth_register", "auth_login")
+MICRO_SCENARIOS = ("best_match", "fuzzy_matcher", "from_search_item", "memory_cache", "rate_limiter")
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "throughput": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+async def drive(fn, total: int, concurrency: int) -> dict:
+    """Call `await fn(i)` for i in range(total) from `concurrency` workers; fn returns False on error."""
+    latencies = []
+    errors = 0
+    indexes = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            start = time.perf_counter()
+            try:
+                ok = await fn(i)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def run_sync(fn, total: int) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(total):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def _configure_env(workdir: str, args):
+    # settings are read when app.config is imported, so this must run first
+    os.environ.update({
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "REDIS_URL": "",
+        "USDA_HOURLY_QUOTA": "0",
+        "CACHE_BACKEND": "memory",
+        "WARM_SNAPSHOT_PATH": "",
+        "RATE_LIMIT": str(args.rate_limit),
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "SECRET_KEY": "benchmark-secret-key-not-for-production",
+        "LOG_FILE": os.path.join(workdir, "app.log"),
+    })
+
+
+async def http_benchmarks(args, selected) -> dict:
+    import httpx
+    import app.routers.calories_router as cr
+    from app.main import create_app
+    from app.services.calories_service import USDAClient
+    from benchmarks.usda_stub import create_stub, load_fixtures, stub_http_client
+
+    # per-request INFO logs would dominate the timings
+    logging.disable(logging.INFO)
+    app = create_app()
+    await app.router.startup()
+    stub = create_stub(latency=args.usda_latency, jitter=args.usda_jitter, error_rate=args.error_rate)
+    await cr.usda_client.close()
+    cr.usda_client = USDAClient("benchmark", http_client=stub_http_client(stub))
+
+    dishes = list(load_fixtures()) + ["unknown dish"]
+    password = "benchmark-password"
+    results = {}
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+            async def get_calories(i):
+                r = await client.post("/get-calories", json={"dish_name": dishes[i % len(dishes)], "servings": 1 + i % 3})
+                return r.status_code in (200, 404)
+
+            async def register(i):
+                r = await client.post("/auth/register", json={"first_name": "Bench", "email": f"user{i}@bench.example.com", "password": password})
+                return r.status_code == 201
+
+            async def login(i):
+                r = await client.post("/auth/login", json={"email": f"user{i % users}@bench.example.com", "password": password})
+                return r.status_code == 200
+
+            if "get_calories" in selected:
+                results["get_calories"] = await drive(get_calories, args.requests, args.concurrency)
+                results["get_calories"]["usda_calls"] = stub.state.calls
+            users = max(1, args.auth_requests)
+            if "auth_register" in selected or "auth_login" in selected:
+                # logins need the registered users, so registration always runs first
+                registered = await drive(register, users, args.concurrency)
+                if "auth_register" in selected:
+                    results["auth_register"] = registered
+            if "auth_login" in selected:
+                results["auth_login"] = await drive(login, users, args.concurrency)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+async def micro_benchmarks(args, selected) -> dict:
+    from app.services.nutrition import FoodRecord
+    from app.utils.cache import InMemoryCache
+    from app.utils.fuzzy import FuzzyMatcher, best_match
+    from app.utils.rate_limiter import RateLimiter
+    from benchmarks.usda_stub import load_fixtures
+
+    items = [food for payload in load_fixtures().values() for food in payload["foods"]]
+    names = [food["description"] for food in items]
+    queries = ["pasta", "white rice", "apple", "chicken breast", "pizza", "salmon", "salad", "oats"]
+    n = args.micro_iterations
+    results = {}
+    if "best_match" in selected:
+        results["best_match"] = run_sync(lambda i: best_match(queries[i % len(queries)], names), n)
+    if "fuzzy_matcher" in selected:
+        matcher = FuzzyMatcher(names)
+        results["fuzzy_matcher"] = run_sync(lambda i: matcher.match(queries[i % len(queries)]), n)
+    if "from_search_item" in selected:
+        # successor of the old _extract_energy: one pass over foodNutrients
+        results["from_search_item"] = run_sync(lambda i: FoodRecord.from_search_item(items[i % len(items)]), n)
+    if "memory_cache" in selected:
+        cache = InMemoryCache(max_entries=10_000)
+
+        async def cache_op(i):
+            key = f"k{i % 20_000}"
+            if await cache.get(key) is None:
+                await cache.set(key, "x" * 64, ex=60)
+            return True
+        results["memory_cache"] = await drive(cache_op, n, 1)
+    if "rate_limiter" in selected:
+        limiter = RateLimiter(InMemoryCache(max_entries=10_000), limit=1000, window=60)
+
+        async def hit(i):
+            await limiter.hit(f"client{i % 1000}")
+            return True
+        results["rate_limiter"] = await drive(hit, n, 1)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base.get("p95_ms") and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if base.get("throughput") and current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput']}/s vs baseline {base['throughput']}/s")
+    return regressions
+
+
+def report(results: dict, baseline: dict):
+    print(f"{'scenario':<18}{'count':>8}{'errors':>8}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'p95 vs base':>13}")
+    for name, r in results.items():
+        delta = ""
+        base = baseline.get(name)
+        if base and base.get("p95_ms"):
+            delta = f"{(r['p95_ms'] / base['p95_ms'] - 1) * 100:+.1f}%"
+        print(f"{name:<18}{r['count']:>8}{r['errors']:>8}{r['throughput']:>12}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{delta:>13}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load and micro benchmarks with a local USDA stand-in")
+    parser.add_argument("--only", default="", help="comma separated scenarios: " + ",".join(HTTP_SCENARIOS + MICRO_SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--auth-requests", type=int, default=50, help="users registered / logins (bcrypt bound)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--micro-iterations", type=int, default=5000)
+    parser.add_argument("--usda-latency", type=float, default=0.05)
+    parser.add_argument("--usda-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--rate-limit", type=int, default=1_000_000)
+    parser.add_argument("--baseline", help="JSON written by --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save", help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    selected = set(filter(None, args.only.split(","))) or set(HTTP_SCENARIOS + MICRO_SCENARIOS)
+    unknown = selected - set(HTTP_SCENARIOS + MICRO_SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _configure_env(workdir, args)
+        results = {}
+        if selected & set(HTTP_SCENARIOS):
+            results.update(asyncio.run(http_benchmarks(args, selected)))
+        if selected & set(MICRO_SCENARIOS):
+            results.update(asyncio.run(micro_benchmarks(args, selected)))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fp:
+            baseline = json.load(fp)["results"]
+    report(results, baseline)
+
+    if args.save:
+        meta = {"python": platform.python_version(), "platform": platform.platform(), "args": vars(args)}
+        with open(args.save, "w", encoding="utf-8") as fp:
+            json.dump({"meta": meta, "results": results}, fp, indent=2)
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
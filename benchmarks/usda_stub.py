@@ -0,0 +1,50 @@
+"""Local stand-in for the FDC `/foods/search` endpoint.
+
+Serves recorded responses from fixtures/foods_search.json (keyed by normalized query) with
+configurable latency and error injection. It is an ASGI app, so `stub_http_client()` can be
+handed straight to `USDAClient(http_client=...)` without opening a socket.
+"""
+import asyncio
+import json
+import os
+import random
+import httpx
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse, Response
+from app.services.calories_service import normalize_dish
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "foods_search.json")
+
+
+def load_fixtures(path: str = FIXTURES) -> dict:
+    with open(path, "r", encoding="utf-8") as fp:
+        return {normalize_dish(q): payload for q, payload in json.load(fp).items()}
+
+
+def create_stub(fixtures: dict | None = None, latency: float = 0.0, jitter: float = 0.0,
+                error_rate: float = 0.0, error_status: int = 503, seed: int | None = 0) -> FastAPI:
+    """`latency` +/- `jitter` seconds per response; `error_rate` of requests get `error_status`."""
+    fixtures = load_fixtures() if fixtures is None else fixtures
+    bodies = {q: json.dumps(payload).encode() for q, payload in fixtures.items()}
+    empty = json.dumps({"totalHits": 0, "foods": []}).encode()
+    rng = random.Random(seed)
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.errors = 0
+
+    @app.get("/fdc/v1/foods/search")
+    async def search(query: str = Query(""), pageSize: int = Query(50)):
+        app.state.calls += 1
+        delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if error_rate and rng.random() < error_rate:
+            app.state.errors += 1
+            return JSONResponse({"error": {"code": "INJECTED", "message": "injected failure"}}, status_code=error_status)
+        return Response(bodies.get(normalize_dish(query), empty), media_type="application/json")
+
+    return app
+
+
+def stub_http_client(stub: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
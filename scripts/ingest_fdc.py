@@ -0,0 +1,46 @@
+# Streams USDA FoodData Central bulk downloads into the local `foods` index.
+# Usage: python -m scripts.ingest_fdc <file.json | csv_dir> [more paths...] [--batch-size 1000]
+# Re-running with a newer FDC release only inserts new foods and updates rows whose content changed.
+import argparse
+import asyncio
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db import Base
+from app.config import settings
+import app.models.food  # noqa: F401  registers the table on Base.metadata
+from app.repositories.food_repo import FoodRepository
+from app.services.fdc_ingest import iter_source, to_row
+
+async def run(paths, batch_size):
+    db_url = settings.DATABASE_URL
+    print("Ingesting FDC data into:", db_url)
+    engine = create_async_engine(db_url, future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    totals = [0, 0, 0]
+    async with Session() as session:
+        repo = FoodRepository(session)
+        for path in paths:
+            batch = {}
+            for item in iter_source(path):
+                row = to_row(item)
+                batch[row["fdc_id"]] = row
+                if len(batch) >= batch_size:
+                    for i, n in enumerate(await repo.sync_batch(list(batch.values()))):
+                        totals[i] += n
+                    batch = {}
+            if batch:
+                for i, n in enumerate(await repo.sync_batch(list(batch.values()))):
+                    totals[i] += n
+            print(f"{path}: inserted={totals[0]} updated={totals[1]} unchanged={totals[2]}")
+    await engine.dispose()
+    print("Done.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest FDC bulk downloads into the local food index")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.paths, args.batch_size))
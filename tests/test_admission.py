@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from app.services.calories_service import CaloriesService, UpstreamUnavailable
+from app.services.nutrition import FoodRecord
+from app.utils.admission import AdaptiveLimiter, Overloaded
+from app.utils.cache import InMemoryCache, RecordCache
+
+
+async def hold(limiter, release: asyncio.Event):
+    async with limiter.slot():
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_overflow_is_rejected_fast_and_queued_requests_time_out():
+    limiter = AdaptiveLimiter("test", initial_limit=1, min_limit=1, max_queue=1, queue_timeout=0.05)
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+    queued = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded) as exc:
+        await hold(limiter, release)
+    assert exc.value.retry_after >= 1
+    with pytest.raises(Overloaded):
+        await queued
+    release.set()
+    await holder
+    stats = limiter.stats()
+    assert (stats["rejected"], stats["timed_out"], stats["inflight"], stats["queued"]) == (1, 1, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_in_order_as_slots_free_up():
+    limiter = AdaptiveLimiter("test", initial_limit=1, min_limit=1, queue_timeout=1.0)
+    order = []
+
+    async def work(i):
+        async with limiter.slot():
+            order.append(i)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[work(i) for i in range(4)])
+    assert order == [0, 1, 2, 3]
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_on_fast_completions_and_backs_off_on_slow_or_failed_ones():
+    limiter = AdaptiveLimiter("test", initial_limit=4, min_limit=1, target_latency=0.02, drop_on=(UpstreamUnavailable,))
+
+    async def quick():
+        async with limiter.slot():
+            await asyncio.sleep(0)
+
+    for _ in range(5):
+        await asyncio.gather(*[quick() for _ in range(4)])
+    grown = limiter.limit
+    assert grown > 4.5
+    # an idle limit is not evidence of spare capacity
+    await quick()
+    assert limiter.limit == grown
+
+    async with limiter.slot():
+        await asyncio.sleep(0.03)
+    assert limiter.limit == pytest.approx(grown * 0.9)
+    # a second cut inside the same latency window is skipped
+    with pytest.raises(UpstreamUnavailable):
+        async with limiter.slot():
+            raise UpstreamUnavailable("down")
+    assert limiter.decreases == 1
+    await asyncio.sleep(0.03)
+    with pytest.raises(UpstreamUnavailable):
+        async with limiter.slot():
+            raise UpstreamUnavailable("down")
+    assert limiter.decreases == 2
+
+
+class SlowUSDA:
+    async def search_records(self, query, page_size=10):
+        await asyncio.sleep(1)
+        return []
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_bypass_a_full_limit():
+    records = RecordCache(InMemoryCache())
+    await records.set("pasta", FoodRecord(fdc_id=1, name="Pasta", data_type="Survey (FNDDS)", energy=158))
+    limiter = AdaptiveLimiter("calories", initial_limit=1, min_limit=1, max_queue=0)
+    service = CaloriesService(SlowUSDA(), records=records, admission=limiter, refresher=None)
+
+    release = asyncio.Event()
+    holder = asyncio.ensure_future(hold(limiter, release))
+    await asyncio.sleep(0)
+    assert (await service.get_calories("Pasta", 2))["total_calories"] == 316
+    with pytest.raises(Overloaded):
+        await service.get_calories("lasagna", 1)
+    release.set()
+    await holder
+
+
+class CountingUSDA:
+    def __init__(self):
+        self.calls = 0
+
+    async def search_records(self, query, page_size=10):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [FoodRecord(fdc_id=1, name="Lasagna", data_type="Survey (FNDDS)", energy=300)]
+
+
+@pytest.mark.asyncio
+async def test_coalesced_followers_do_not_take_slots():
+    limiter = AdaptiveLimiter("calories", initial_limit=1, min_limit=1, max_queue=0)
+    usda = CountingUSDA()
+    service = CaloriesService(usda, records=RecordCache(InMemoryCache()), admission=limiter, refresher=None)
+    results = await asyncio.gather(*[service.get_calories("lasagna", 1) for _ in range(10)])
+    assert [r["total_calories"] for r in results] == [300] * 10
+    assert usda.calls == 1
+    assert limiter.stats()["admitted"] == 1 and limiter.stats()["rejected"] == 0
@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from app.config import settings
+from app.services.auth_service import AuthService
+from app.utils.hash_pool import PasswordHasher, PoolSaturated
+from app.utils.security import pwd_context
+
+
+class FakeUser:
+    id = 1
+
+    def __init__(self, hashed_password):
+        self.hashed_password = hashed_password
+
+
+class FakeRepo:
+    def __init__(self, user):
+        self.user = user
+        self.updates = 0
+
+    async def get_by_email(self, email):
+        return self.user
+
+    async def update_password(self, user, hashed_password):
+        self.updates += 1
+        user.hashed_password = hashed_password
+        return user
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_when_cost_differs():
+    user = FakeUser(pwd_context.using(bcrypt__rounds=4).hash("password123"))
+    repo = FakeRepo(user)
+    service = AuthService(repo, hasher=PasswordHasher(workers=1))
+
+    assert await service.login("a@b.com", "password123")
+    assert repo.updates == 1
+    assert user.hashed_password.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+
+    await service.login("a@b.com", "password123")
+    assert repo.updates == 1
+    with pytest.raises(ValueError):
+        await service.login("a@b.com", "wrong-password")
+
+
+@pytest.mark.asyncio
+async def test_hash_pool_rejects_when_saturated():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    results = await asyncio.gather(*[hasher._run(time.sleep, 0.05) for _ in range(3)], return_exceptions=True)
+    assert sum(isinstance(r, PoolSaturated) for r in results) == 1
+    assert hasher.stats()["rejected"] == 1
+    hasher.shutdown()
+
+
+class FakeSession:
+    def __init__(self, user):
+        self.user = user
+        self.gets = 0
+
+    async def get(self, model, ident):
+        self.gets += 1
+        return self.user
+
+
+@pytest.mark.asyncio
+async def test_current_user_uses_claims_and_user_caches(monkeypatch):
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+    from app.routers import deps
+    from app.utils.security import create_access_token
+
+    decodes = []
+    real_decode = deps.decode_access_token
+    monkeypatch.setattr(deps, "decode_access_token", lambda t: decodes.append(t) or real_decode(t))
+    deps.claims_cache._data.clear()
+    deps.user_cache._data.clear()
+
+    user = FakeUser("x")
+    user.is_active = True
+    session = FakeSession(user)
+    creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"sub": "1"}))
+    for _ in range(3):
+        assert await deps.get_current_user(await deps.get_optional_user(creds, session)) is user
+    assert len(decodes) == 1
+    assert session.gets == 1
+
+    with pytest.raises(HTTPException) as exc:
+        await deps.get_optional_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials="garbage"), session)
+    assert exc.value.status_code == 401
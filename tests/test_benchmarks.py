@@ -0,0 +1,38 @@
+import pytest
+from app.services.calories_service import USDAClient, UpstreamUnavailable
+from app.utils.circuit_breaker import CircuitBreaker
+from benchmarks.run import compare, percentile, summarize
+from benchmarks.usda_stub import create_stub, stub_http_client
+
+
+@pytest.mark.asyncio
+async def test_stub_serves_fixtures_to_usda_client():
+    stub = create_stub()
+    usda = USDAClient("test", http_client=stub_http_client(stub))
+    records = await usda.search_records("Pasta")
+    assert records[0].calories_per_serving() == pytest.approx(158 * 1.4)
+    assert await usda.search_records("no such dish") == []
+    await usda.close()
+
+
+@pytest.mark.asyncio
+async def test_stub_error_injection(monkeypatch):
+    monkeypatch.setattr("app.services.calories_service.settings.USDA_RETRIES", 0)
+    stub = create_stub(error_rate=1.0)
+    usda = USDAClient("test", http_client=stub_http_client(stub), breaker=CircuitBreaker(100, 30))
+    with pytest.raises(UpstreamUnavailable):
+        await usda.search_records("pasta")
+    assert stub.state.errors == 1
+    await usda.close()
+
+
+def test_summary_and_baseline_compare():
+    stats = summarize([i / 1000 for i in range(1, 101)], elapsed=1.0)
+    assert (stats["p50_ms"], stats["p95_ms"], stats["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert percentile([], 95) == 0.0
+    baseline = {"a": {"p95_ms": 50.0, "throughput": 200.0}}
+    assert compare({"a": stats}, baseline, tolerance=0.2) == [
+        "a: p95 95.0ms vs baseline 50.0ms",
+        "a: throughput 100.0/s vs baseline 200.0/s",
+    ]
+    assert compare({"a": stats}, {}, tolerance=0.2) == []
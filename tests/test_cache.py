@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from app.utils.cache import InMemoryCache
+
+
+@pytest.mark.asyncio
+async def test_entries_are_bounded_with_lru_eviction():
+    cache = InMemoryCache(max_entries=8, shards=1)
+    for i in range(8):
+        await cache.set(f"k{i}", "v")
+    await cache.get("k0")
+    await cache.set("k8", "v")
+    assert await cache.get("k0") == "v"
+    assert await cache.get("k1") is None
+    stats = cache.stats()
+    assert stats["entries"] == 8
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_byte_budget_and_sweeper():
+    cache = InMemoryCache(max_entries=1000, max_bytes=2000, shards=1, sweep_interval=0.01)
+    for i in range(100):
+        await cache.set(f"k{i}", "x" * 100, ex=1)
+    assert cache.stats()["bytes"] <= 2000
+
+    await cache.set("short", "v", ex=0.02)
+    await cache.zadd("rl:ip", {"a": 1, "b": 2})
+    await cache.expire("rl:ip", 0.02)
+    cache.start()
+    await asyncio.sleep(0.1)
+    await cache.close()
+    assert cache.stats()["expirations"] >= 2
+    assert await cache.zcard("rl:ip") == 0
+
+
+@pytest.mark.asyncio
+async def test_sorted_set_surface():
+    cache = InMemoryCache()
+    await cache.zadd("z", {"a": 1, "b": 5, "c": 9})
+    assert await cache.zremrangebyscore("z", 0, 5) == 2
+    assert await cache.zcard("z") == 1
+    assert await cache.set("lock", "1", ex=5, nx=True)
+    assert await cache.set("lock", "2", ex=5, nx=True) is None
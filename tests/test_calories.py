@@ -1,6 +1,15 @@
+import asyncio
+import json
+import time
 import pytest
 from httpx import AsyncClient
 from app.main import create_app
+from app.services.calories_service import INTERACTIVE, CaloriesService, usda_priority
+from app.services.nutrition import FoodRecord, parse_search_payload
+from app.utils.cache import InMemoryCache, RecordCache
+from app.utils.codec import RecordCodec, NOT_FOUND
+from app.utils.refresher import BackgroundRefresher
+from app.utils.singleflight import SingleFlight
 
 @pytest.mark.asyncio
 async def test_invalid_servings():
@@ -8,3 +17,180 @@ async def test_invalid_servings():
     async with AsyncClient(app=app, base_url="http://test") as ac:
         resp = await ac.post("/get-calories", json={"dish_name": "pasta", "servings": 0})
         assert resp.status_code == 400
+
+
+class FakeUSDA:
+    def __init__(self, foods):
+        self.foods = foods
+        self.calls = 0
+
+    async def search_records(self, query, page_size=10):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [FoodRecord.from_search_item(f) for f in self.foods]
+
+
+PASTA = {
+    "description": "Pasta, cooked",
+    "dataType": "Survey (FNDDS)",
+    "foodNutrients": [{"nutrientNumber": "208", "nutrientName": "Energy", "value": 158, "unitName": "KCAL"}],
+}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_coalesce():
+    usda = FakeUSDA([PASTA])
+    cache = InMemoryCache()
+    flight = SingleFlight(dumps=RecordCodec.dumps, loads=RecordCodec.loads_record)
+    results = await asyncio.gather(*[
+        CaloriesService(usda, cache, flight=flight).get_calories("Pasta", s) for s in (1, 1.5, 2, 1, 3)
+    ])
+    assert usda.calls == 1
+    assert flight.leaders == 1
+    assert flight.coalesced == 4
+    assert results[1]["total_calories"] == 237.0
+
+
+@pytest.mark.asyncio
+async def test_record_cache_is_servings_independent_and_caches_misses():
+    usda = FakeUSDA([PASTA])
+    records = RecordCache(InMemoryCache(), l1_size=16)
+    for servings in (1, 1.5, 2):
+        await CaloriesService(usda, records=records).get_calories("pasta", servings)
+    assert usda.calls == 1
+
+    empty = FakeUSDA([])
+    for _ in range(3):
+        with pytest.raises(LookupError):
+            await CaloriesService(empty, records=records).get_calories("xyzzy", 1)
+    assert empty.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_not_found_written_by_another_worker_is_a_lookup_error():
+    # the leader finds a "not found" another worker cached while it waited on the shared lock
+    shared = InMemoryCache()
+    await RecordCache(shared).set_not_found("xyzzy")
+    usda = FakeUSDA([])
+    flight = SingleFlight(dumps=RecordCodec.dumps, loads=RecordCodec.loads_record)
+    service = CaloriesService(usda, shared, flight=flight, records=RecordCache(shared))
+    with pytest.raises(LookupError):
+        await service._coalesced("xyzzy", "xyzzy")
+    assert usda.calls == 0
+
+
+def test_record_codec_roundtrip():
+    record = FoodRecord.from_search_item(PASTA)
+    raw = RecordCodec.dumps(record, 1700000000.0)
+    assert isinstance(raw, str)
+    assert RecordCodec.loads(raw) == (record, 1700000000.0)
+    assert RecordCodec.loads(RecordCodec.dumps(NOT_FOUND))[0] is NOT_FOUND
+
+
+class PerDishUSDA(FakeUSDA):
+    async def search_records(self, query, page_size=10):
+        self.calls += 1
+        return [FoodRecord.from_search_item(f) for f in self.foods if f["description"].lower().startswith(query.lower())]
+
+
+@pytest.mark.asyncio
+async def test_lookup_many_dedupes_and_uses_cached_records():
+    usda = PerDishUSDA([PASTA])
+    records = RecordCache(InMemoryCache(), l1_size=16)
+    await CaloriesService(usda, records=records).get_calories("pasta", 1)
+
+    found = await CaloriesService(usda, records=records).lookup_many(["Pasta", "pasta ", "nothing here", "pasta"])
+    assert usda.calls == 2
+    assert found["pasta"].calories_per_serving() == 158
+    assert isinstance(found["nothing here"], LookupError)
+
+
+@pytest.mark.asyncio
+async def test_soft_expired_record_is_served_and_refreshed_once():
+    usda = FakeUSDA([PASTA])
+    records = RecordCache(InMemoryCache(), l1_size=16, ttl=60, hard_ttl=3600)
+    refresher = BackgroundRefresher()
+    await records.set("pasta", FoodRecord.from_search_item(PASTA), stored_at=time.time() - 120)
+
+    service = CaloriesService(usda, records=records, flight=SingleFlight(), refresher=refresher)
+    results = await asyncio.gather(*[service.get_calories("pasta", 1) for _ in range(5)])
+    assert all(r["calories_per_serving"] == 158 for r in results)
+    assert refresher.stale_served == 5
+    assert refresher.scheduled == 1
+
+    await asyncio.gather(*refresher._tasks.values())
+    assert usda.calls == 1
+    assert not records.needs_refresh(await records.get_entry("pasta"))
+    await refresher.close()
+
+
+class StalledRefreshUSDA(FakeUSDA):
+    def __init__(self, foods):
+        super().__init__(foods)
+        self.release = asyncio.Event()
+
+    async def search_records(self, query, page_size=10):
+        if usda_priority.get() != INTERACTIVE:
+            # a background call stuck behind the quota
+            await self.release.wait()
+        return await super().search_records(query, page_size)
+
+
+@pytest.mark.asyncio
+async def test_user_lookup_does_not_follow_a_background_refresh():
+    usda = StalledRefreshUSDA([PASTA])
+    service = CaloriesService(usda, records=RecordCache(InMemoryCache(), l1_size=16), flight=SingleFlight())
+    refresh = asyncio.create_task(service._refresh("pasta", "pasta"))
+    await asyncio.sleep(0.01)
+
+    record = await asyncio.wait_for(service.lookup("pasta"), 1)
+    assert record.calories_per_serving() == 158
+    usda.release.set()
+    await refresh
+    assert usda.calls == 2
+
+
+def test_parse_search_payload_keeps_compact_records():
+    sr_legacy = {
+        "fdcId": 171688,
+        "description": "Apples, raw, with skin",
+        "dataType": "SR Legacy",
+        "foodNutrients": [
+            {"nutrientNumber": "268", "nutrientName": "Energy", "value": 218, "unitName": "kJ"},
+            {"nutrientNumber": "208", "nutrientName": "Energy", "value": 52, "unitName": "KCAL"},
+            {"nutrientNumber": "203", "nutrientName": "Protein", "value": 0.26, "unitName": "G"},
+            {"nutrientNumber": "204", "nutrientName": "Total lipid (fat)", "value": 0.17, "unitName": "G"},
+            {"nutrientNumber": "205", "nutrientName": "Carbohydrate, by difference", "value": 13.8, "unitName": "G"},
+        ],
+        "foodPortions": [{"gramWeight": 200}],
+    }
+    [rec] = parse_search_payload(json.dumps({"foods": [sr_legacy]}).encode())
+    assert not hasattr(rec, "__dict__")
+    assert rec.calories_per_serving() == 104
+    assert rec.macros_per_serving() == {"protein_g": 0.52, "fat_g": 0.34, "carbohydrate_g": 27.6}
+
+
+@pytest.mark.asyncio
+async def test_get_calories_etag_and_conditional_request(monkeypatch):
+    import app.routers.calories_router as cr
+    monkeypatch.setattr(cr, "usda_client", FakeUSDA([PASTA]))
+    monkeypatch.setattr(cr, "cache_client", InMemoryCache())
+    monkeypatch.setattr(cr, "record_cache", RecordCache(None, l1_size=16))
+    monkeypatch.setattr("app.services.calories_service.settings.LOCAL_FOOD_INDEX", False)
+    app = create_app()
+    app.dependency_overrides[cr.get_db] = lambda: None
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        first = await ac.get("/calories", params={"dish": "pasta", "servings": 2})
+        assert first.status_code == 200
+        assert first.json()["total_calories"] == 316.0
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"].startswith("public, max-age=")
+
+        again = await ac.get("/calories", params={"dish": "pasta", "servings": 2}, headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert again.status_code == 304
+        assert again.headers["etag"] == etag
+        assert again.content == b""
+
+        other = await ac.get("/calories", params={"dish": "pasta", "servings": 3}, headers={"If-None-Match": etag})
+        assert other.status_code == 200
+        assert other.headers["etag"] != etag
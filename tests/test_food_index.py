@@ -0,0 +1,137 @@
+import json
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db import Base
+from app.repositories.food_repo import FoodRepository
+from app.services.calories_service import CaloriesService
+from app.services.fdc_ingest import iter_csv_foods, iter_source, to_row
+from app.services.nutrition import FoodRecord
+
+
+def _food(fdc_id, description, kcal):
+    return {
+        "fdcId": fdc_id,
+        "description": description,
+        "dataType": "Foundation",
+        "publicationDate": "2024-04-18",
+        "foodNutrients": [
+            {"nutrient": {"number": "268", "name": "Energy", "unitName": "kJ"}, "amount": kcal * 4.184},
+            {"nutrient": {"number": "208", "name": "Energy", "unitName": "kcal"}, "amount": kcal},
+        ],
+    }
+
+
+class NoUSDA:
+    async def search_records(self, query, page_size=10):
+        raise AssertionError("USDA should not be called when the local index matches")
+
+
+@pytest.mark.asyncio
+async def test_ingest_is_incremental_and_serves_lookups(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'foods.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    release = tmp_path / "foundation.json"
+    release.write_text(json.dumps({"FoundationFoods": [_food(1, "Apples, raw", 52), _food(2, "Pasta, cooked", 158)]}))
+    async with Session() as session:
+        repo = FoodRepository(session)
+        assert await repo.sync_batch([to_row(i) for i in iter_source(str(release))]) == (2, 0, 0)
+
+        release.write_text(json.dumps({"FoundationFoods": [_food(1, "Apples, raw", 52), _food(2, "Pasta, cooked", 160)]}))
+        assert await repo.sync_batch([to_row(i) for i in iter_source(str(release))]) == (0, 1, 1)
+
+        res = await CaloriesService(NoUSDA(), food_repo=repo).get_calories("pasta", 2)
+        assert res["calories_per_serving"] == 160
+        assert res["source"] == "USDA FoodData Central (local index)"
+    await engine.dispose()
+
+
+class CountingUSDA:
+    def __init__(self):
+        self.queries = []
+
+    async def search_records(self, query, page_size=10):
+        self.queries.append(query)
+        return []
+
+
+@pytest.mark.asyncio
+async def test_batch_lookups_use_the_local_index(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.services.calories_service.settings.LOCAL_FOOD_INDEX", True)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'foods.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    release = tmp_path / "foundation.json"
+    release.write_text(json.dumps({"FoundationFoods": [_food(i, f"Dish number {i}, cooked", 100 + i) for i in range(1, 9)]}))
+    async with Session() as session:
+        repo = FoodRepository(session)
+        await repo.sync_batch([to_row(i) for i in iter_source(str(release))])
+
+        usda = CountingUSDA()
+        service = CaloriesService(usda, food_repo=repo, hot_dishes=None, suggestions=None, admission=None)
+        found = await service.lookup_many([f"dish number {i}" for i in range(1, 9)] + ["no such dish"], concurrency=4)
+    await engine.dispose()
+
+    assert found["dish number 3"].energy == 103
+    assert isinstance(found["no such dish"], LookupError)
+    assert usda.queries == ["no such dish"]
+
+
+
+@pytest.mark.asyncio
+async def test_search_matches_word_prefixes_in_any_order(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'foods.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    release = tmp_path / "foundation.json"
+    release.write_text(json.dumps({"FoundationFoods": [_food(1, "Chicken, breast, roasted", 165), _food(2, "Rice, white", 130)]}))
+    async with Session() as session:
+        repo = FoodRepository(session)
+        await repo.sync_batch([to_row(i) for i in iter_source(str(release))])
+        assert [f.fdc_id for f in await repo.search("rice")] == [2]
+        assert [f.fdc_id for f in await repo.search("roasted chick")] == [1]
+        assert await repo.search("roasted rice") == []
+
+        release.write_text(json.dumps({"FoundationFoods": [_food(2, "Rice, brown", 123)]}))
+        await repo.sync_batch([to_row(i) for i in iter_source(str(release))])
+        assert await repo.search("white rice") == []
+        assert [f.fdc_id for f in await repo.search("brown")] == [2]
+    await engine.dispose()
+
+
+def _write_csv(path, header, rows):
+    path.write_text("\n".join([",".join(header)] + [",".join(map(str, r)) for r in rows]) + "\n")
+
+
+def test_csv_tables_are_merge_joined_out_of_order(tmp_path):
+    _write_csv(tmp_path / "nutrient.csv", ["id", "name", "unit_name", "nutrient_nbr"], [
+        (1008, "Energy", "KCAL", 208), (2048, "Energy (Atwater Specific Factors)", "KCAL", 958),
+        (1003, "Protein", "G", 203), (1062, "Energy", "kJ", 268),
+    ])
+    _write_csv(tmp_path / "food.csv", ["fdc_id", "data_type", "description", "publication_date"], [
+        (30, "branded_food", "Granola bar", "2024-04-18"),
+        (10, "foundation_food", "Apples raw", "2024-04-18"),
+        (20, "foundation_food", "Rice cooked", "2024-04-18"),
+    ])
+    _write_csv(tmp_path / "food_nutrient.csv", ["id", "fdc_id", "nutrient_id", "amount"], [
+        (1, 20, 2048, 131), (2, 30, 1008, 450), (3, 10, 1062, 218), (4, 20, 1003, 2.7),
+        (5, 10, 1008, 52), (6, 20, 1008, 130), (7, 30, 1003, 8),
+    ])
+    _write_csv(tmp_path / "food_portion.csv", ["id", "fdc_id", "gram_weight"], [(1, 10, 182), (2, 10, 125)])
+    _write_csv(tmp_path / "branded_food.csv", ["fdc_id", "brand_owner", "serving_size", "serving_size_unit"], [
+        (30, "Acme", 40, "g"),
+    ])
+
+    items = list(iter_csv_foods(str(tmp_path), chunk_rows=2))
+    assert [i["fdcId"] for i in items] == [10, 20, 30]
+    apple, rice, bar = (FoodRecord.from_search_item(i) for i in items)
+    assert (apple.energy, apple.gram_weight) == (52, 182)
+    assert (rice.energy, rice.protein) == (130, 2.7)
+    assert (bar.energy, bar.serving_size, bar.serving_size_unit) == (450, 40, "g")
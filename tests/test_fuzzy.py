@@ -0,0 +1,18 @@
+from rapidfuzz import fuzz, process
+from app.utils.fuzzy import FuzzyMatcher, best_match
+
+CANDIDATES = ["Pasta, cooked", "Apples, raw", "Chicken soup, canned", "Rice, white, cooked", "Pasta salad"]
+
+
+def test_best_match_agrees_with_process_extract():
+    for query in ("pasta", "chiken soup", "apple"):
+        expected = process.extract(query, CANDIDATES, scorer=fuzz.WRatio, limit=2)
+        assert best_match(query, CANDIDATES, limit=2) == [(c, s, i) for c, s, i in expected]
+
+
+def test_prefiltered_batch_matching():
+    candidates = [f"Brand {i} granola bar" for i in range(500)] + CANDIDATES
+    matcher = FuzzyMatcher(candidates, prefilter_min=64, max_candidates=50)
+    results = matcher.match_many(["chicken soup", "white rice"], limit=1)
+    assert results[0][0][0] == "Chicken soup, canned"
+    assert results[1][0][0] == "Rice, white, cooked"
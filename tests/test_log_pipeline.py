@@ -0,0 +1,58 @@
+import json
+import logging
+import queue
+from app.utils.log_pipeline import DroppingQueueHandler, JsonFormatter, SamplingFilter, setup_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _record(msg, *args, level=logging.WARNING, **extra):
+    record = logging.LogRecord("meal_calorie_app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.handle(_record("message %s", i))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_sampling_per_message_key():
+    sampler = SamplingFilter(burst=2, interval=60)
+    passed = [sampler.filter(_record("Failed login attempt for user: %s", f"u{i}@x.com")) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert sampler.filter(_record("another message"))
+    assert sampler.filter(_record("boom", level=logging.ERROR))
+    assert sampler.suppressed == 3
+
+    sampler._windows[("meal_calorie_app.test", "Failed login attempt for user: %s")][0] -= 61
+    record = _record("Failed login attempt for user: %s", "late@x.com")
+    assert sampler.filter(record)
+    assert record.getMessage() == "Failed login attempt for user: late@x.com (3 similar messages suppressed)"
+
+
+def test_pipeline_writes_json_on_background_thread():
+    logger = logging.getLogger("meal_calorie_app.test_pipeline")
+    logger.propagate = False
+    target = ListHandler()
+    pipeline = setup_logging(logger, [target], JsonFormatter(), sample_burst=0)
+    try:
+        logger.warning("hello %s", "world", extra={"request_id": "r1"})
+    finally:
+        pipeline.stop()
+        logger.removeHandler(pipeline.handler)
+    [line] = target.lines
+    data = json.loads(line)
+    assert data["message"] == "hello world"
+    assert data["level"] == "WARNING"
+    assert data["request_id"] == "r1"
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.db import Base, get_db
+from app.main import create_app
+from app.models.user import User
+from app.routers.deps import get_current_user
+from app.services.meal_log import MealLogWriter
+
+
+def _result(dish, servings, calories, protein=None):
+    return {
+        "dish_name": dish,
+        "servings": servings,
+        "total_calories": calories,
+        "macros_per_serving": {"protein_g": protein, "fat_g": None, "carbohydrate_g": None},
+        "fdc_id": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_write_behind_batches_and_rolls_up(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'meals.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as session:
+        session.add_all([User(id=1, first_name="A", email="a@x.com", hashed_password="x"),
+                         User(id=2, first_name="B", email="b@x.com", hashed_password="x")])
+        await session.commit()
+
+    writer = MealLogWriter(batch_size=3, flush_interval=60, session_factory=Session)
+    for _ in range(4):
+        writer.add(1, _result("pasta", 2, 316.0, protein=5.8))
+    writer.add(2, _result("apple", 1, 52.0))
+    assert writer.stats()["pending"] == 5
+    assert await writer.flush() == 3
+    await writer.close()
+    assert writer.stats() == {
+        "pending": 0, "written": 5, "flushes": 2, "dropped": 0, "failed_flushes": 0, "dead_lettered": 0,
+    }
+
+    app = create_app()
+    current = {"user": None}
+
+    async def override_db():
+        async with Session() as session:
+            yield session
+    app.dependency_overrides[get_db] = override_db
+    app.dependency_overrides[get_current_user] = lambda: current["user"]
+    async with Session() as session:
+        current["user"] = await session.get(User, 1)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        body = (await ac.get("/meals/summary")).json()
+    assert body["entries"] == 4
+    assert body["total_calories"] == 1264.0
+    [day] = body["days"]
+    assert day["protein_g"] == 46.4
+    await engine.dispose()
+
+
+class NoSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_a_batch_that_keeps_failing_is_dead_lettered(monkeypatch):
+    written = []
+
+    async def add_entries(self, rows):
+        if any(r["dish_name"] == "bad" for r in rows):
+            raise ValueError("bad row")
+        written.extend(rows)
+
+    monkeypatch.setattr("app.services.meal_log.MealRepository.add_entries", add_entries)
+    writer = MealLogWriter(batch_size=2, flush_interval=0.01, max_attempts=3, session_factory=NoSession)
+    writer.add(1, _result("bad", 1, 1.0))
+    writer.add(1, _result("pasta", 1, 158.0))
+    writer.add(1, _result("apple", 1, 52.0))
+    writer.start()
+    for _ in range(100):
+        if writer.stats()["pending"] == 0:
+            break
+        await asyncio.sleep(0.01)
+    await writer.close()
+
+    assert [r["dish_name"] for r in written] == ["apple"]
+    assert [r["dish_name"] for r in writer.dead_letters] == ["bad", "pasta"]
+    stats = writer.stats()
+    assert stats["dead_lettered"] == 2 and stats["failed_flushes"] == 3
+
+@pytest.mark.asyncio
+async def test_summary_requires_auth():
+    async with AsyncClient(app=create_app(), base_url="http://test") as ac:
+        assert (await ac.get("/meals/summary")).status_code == 401
@@ -0,0 +1,51 @@
+import logging
+import pytest
+from httpx import AsyncClient
+from app.main import create_app
+from app.utils.metrics import Registry
+from app.utils.request_context import RequestIdFilter, request_id_var
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    hits = registry.counter("test_hits_total", "Hits", ("layer",))
+    latency = registry.histogram("test_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    hits.inc("l1")
+    hits.inc("l1", amount=2)
+    latency.observe(0.05, "usda")
+    latency.observe(0.5, "usda")
+    registry.stats_gauge("test_pool", "Pool", lambda: {"pending": 3, "state": "closed"})
+
+    text = registry.render()
+    assert '# TYPE test_hits_total counter' in text
+    assert 'test_hits_total{layer="l1"} 3' in text
+    assert 'test_seconds_bucket{stage="usda",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="usda",le="+Inf"} 2' in text
+    assert 'test_seconds_count{stage="usda"} 2' in text
+    assert 'test_pool{stat="pending"} 3' in text
+    assert "state" not in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_and_request_id():
+    app = create_app()
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        resp = await ac.get("/metrics", headers={"X-Request-ID": "abc-123"})
+        assert resp.status_code == 200
+        assert resp.headers["x-request-id"] == "abc-123"
+        assert "# TYPE meal_stage_seconds histogram" in resp.text
+
+        resp = await ac.get("/metrics", headers={"X-Request-ID": "bad id\" with junk"})
+        assert len(resp.headers["x-request-id"]) == 32
+        resp = await ac.get("/metrics")
+        assert 'meal_http_request_seconds_count{method="GET",route="/metrics",status="200"}' in resp.text
+
+
+def test_request_id_filter_reads_context():
+    record = logging.LogRecord("meal_calorie_app", logging.INFO, __file__, 1, "hi", (), None)
+    token = request_id_var.set("req-1")
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    assert record.request_id == "req-1"
@@ -0,0 +1,63 @@
+import pstats
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from app.config import settings
+from app.routers import debug_router
+from app.utils.profiling import ProfileStore, ProfilingMiddleware
+from app.utils.request_context import RequestContextMiddleware
+
+
+def profiled_app(store, token="secret", sample_rate=0.0):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return {"total": sum(i * i for i in range(10_000))}
+
+    app.include_router(debug_router.router)
+    app.add_middleware(ProfilingMiddleware, store=store, token=token, sample_rate=sample_rate)
+    app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+@pytest.mark.asyncio
+async def test_only_requests_with_the_token_are_profiled_and_the_directory_is_bounded(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=2)
+    async with AsyncClient(app=profiled_app(store), base_url="http://test") as ac:
+        plain = await ac.get("/work")
+        wrong = await ac.get("/work", headers={"X-Profile": "guess"})
+        assert "x-profile-id" not in plain.headers and "x-profile-id" not in wrong.headers
+        assert store.recent() == []
+
+        ids = []
+        for rid in ("first", "second", "third"):
+            r = await ac.get("/work", headers={"X-Profile": "secret", "X-Request-ID": rid})
+            assert r.status_code == 200
+            ids.append(r.headers["x-profile-id"])
+    assert ids[0].endswith("-first")
+
+    recent = store.recent()
+    assert [p["id"] for p in recent] == ids[:0:-1]
+    assert recent[0]["route"] == "/work" and recent[0]["status"] == 200
+    assert any("<genexpr>" in f["function"] for f in recent[0]["top"])
+    assert store.file_for(ids[0]) is None
+    assert pstats.Stats(store.file_for(ids[2])).total_calls > 0
+    assert store.stats()["files"] == 2
+
+
+@pytest.mark.asyncio
+async def test_profiles_endpoint_requires_the_token(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path))
+    monkeypatch.setattr(debug_router, "profile_store", store)
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", "secret")
+    async with AsyncClient(app=profiled_app(store, token="", sample_rate=1.0), base_url="http://test") as ac:
+        profile_id = (await ac.get("/work")).headers["x-profile-id"]
+        assert (await ac.get("/debug/profiles")).status_code == 403
+        listing = await ac.get("/debug/profiles", headers={"X-Profile": "secret"})
+        assert listing.status_code == 200
+        assert profile_id in [p["id"] for p in listing.json()["profiles"]]
+        download = await ac.get(f"/debug/profiles/{profile_id}", headers={"X-Profile": "secret"})
+        assert download.status_code == 200 and download.content
+        missing = await ac.get("/debug/profiles/..%2Fsecrets", headers={"X-Profile": "secret"})
+        assert missing.status_code == 404
@@ -0,0 +1,25 @@
+import asyncio
+import pytest
+from app.utils.cache import InMemoryCache
+from app.utils.rate_limiter import RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_gcra_allows_exactly_the_limit_under_concurrency():
+    limiter = RateLimiter(InMemoryCache(), limit=5, window=60)
+    results = await asyncio.gather(*[limiter.hit("1.2.3.4") for _ in range(12)])
+    assert sum(r.allowed for r in results) == 5
+    assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+
+    denied = results[-1]
+    assert not denied.allowed
+    assert 0 < denied.retry_after <= 12
+    assert denied.headers()["Retry-After"] == "12"
+
+
+@pytest.mark.asyncio
+async def test_weighted_hit_and_independent_keys():
+    limiter = RateLimiter(InMemoryCache(), limit=10, window=60)
+    assert (await limiter.hit("a", cost=10)).allowed
+    assert not (await limiter.hit("a")).allowed
+    assert await limiter.is_allowed("b")
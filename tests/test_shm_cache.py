@@ -0,0 +1,69 @@
+import asyncio
+import multiprocessing
+import sys
+import pytest
+from app.utils.rate_limiter import RateLimiter
+from app.utils.shm_cache import SharedMemoryCache
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="needs fcntl")
+
+
+@pytest.mark.asyncio
+async def test_get_set_nx_expiry_and_delete(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / "cache"), slots=64, slot_size=128)
+    assert await cache.set("a", "1") is True
+    assert await cache.set("a", "2", nx=True) is None
+    assert await cache.get("a") == "1"
+    await cache.set("b", b"\x00bytes", ex=1)
+    assert await cache.mget(["a", "b", "c"]) == ["1", b"\x00bytes", None]
+    assert await cache.delete("a") == 1
+    assert await cache.get("a") is None
+    assert await cache.set("big", "x" * 200) is None
+    assert cache.stats()["oversize"] == 1
+    await asyncio.sleep(1.1)
+    assert await cache.get("b") is None
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_full_bucket_evicts_least_recently_used(tmp_path):
+    cache = SharedMemoryCache(str(tmp_path / "cache"), slots=4, slot_size=128, ways=4)
+    for i in range(4):
+        await cache.set(f"k{i}", str(i))
+    await cache.get("k0")
+    await cache.set("k4", "4")
+    assert await cache.get("k1") is None
+    assert await cache.get("k0") == "0"
+    assert cache.stats()["evictions"] == 1
+    await cache.close()
+
+
+def _worker(path, hits, out):
+    async def run():
+        cache = SharedMemoryCache(path, slots=64, slot_size=128)
+        limiter = RateLimiter(cache, limit=15, window=60)
+        allowed = sum([(await limiter.hit("client")).allowed for _ in range(hits)])
+        await cache.close()
+        return allowed
+    out.put(asyncio.run(run()))
+
+
+def test_rate_limit_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "cache")
+    SharedMemoryCache(path, slots=64, slot_size=128)
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, 10, out)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    allowed = sum(out.get(timeout=30) for _ in procs)
+    for p in procs:
+        p.join()
+    assert allowed == 15
+
+
+def test_layout_mismatch_is_rejected(tmp_path):
+    path = str(tmp_path / "cache")
+    SharedMemoryCache(path, slots=64, slot_size=128)
+    with pytest.raises(ValueError):
+        SharedMemoryCache(path, slots=128, slot_size=128)
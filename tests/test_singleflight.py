@@ -0,0 +1,59 @@
+import asyncio
+import sys
+import pytest
+from app.utils.cache import InMemoryCache
+from app.utils.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_followers_retry_when_the_leader_is_cancelled():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    leader = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(flight.do("k", work)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await asyncio.gather(*followers) == [2, 2, 2]
+    assert leader.cancelled()
+    assert flight.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_follower_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0.01)
+    follower.cancel()
+    assert await leader == "done"
+    assert follower.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_lock_is_released_only_by_its_holder(tmp_path):
+    caches = [InMemoryCache()]
+    if sys.platform != "win32":
+        from app.utils.shm_cache import SharedMemoryCache
+        caches.append(SharedMemoryCache(str(tmp_path / "cache"), slots=64, slot_size=128))
+    for cache in caches:
+        flight = SingleFlight()
+        await cache.set("sf:lock:k", "mine")
+        await flight._release(cache, "sf:lock:k", "someone else")
+        assert await cache.get("sf:lock:k") == "mine"
+        await flight._release(cache, "sf:lock:k", "mine")
+        assert await cache.get("sf:lock:k") is None
+        await cache.close()
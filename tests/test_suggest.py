@@ -0,0 +1,79 @@
+import random
+import time
+import pytest
+from httpx import AsyncClient
+from app.main import create_app
+from app.services.calories_service import CaloriesService
+from app.utils.suggest import SuggestIndex
+
+
+def test_prefix_and_typo_suggestions_ranked_by_popularity():
+    index = SuggestIndex()
+    index.add("chicken breast", "Chicken breast, roasted", count=5)
+    index.add("chicken curry", "Chicken curry", count=50)
+    index.add("chickpea salad", None, count=1)
+    index.add("grilled chicken sandwich", None, count=0)
+
+    names = [s["dish_name"] for s in index.suggest("chick")]
+    assert names[:3] == ["chicken curry", "chicken breast", "chickpea salad"]
+    assert "grilled chicken sandwich" in names
+    assert index.suggest("chicken br")[0]["dish_name"] == "chicken breast"
+    assert index.suggest("chiken brest")[0]["dish_name"] == "chicken breast"
+    assert index.suggest("zzz") == []
+
+
+def test_index_stays_bounded():
+    index = SuggestIndex(max_entries=100)
+    index.add("popular dish", count=1000)
+    for i in range(500):
+        index.add(f"dish number {i}")
+    assert len(index) <= 100
+    assert index.suggest("popular")[0]["dish_name"] == "popular dish"
+    assert sum(map(len, index._postings.values())) == sum(len(set(k.split())) for k in index._entries)
+    assert sorted(index._keys) == sorted(index._entries)
+
+
+def test_popular_names_are_found_behind_many_shared_prefixes():
+    index = SuggestIndex(max_scan=256)
+    for i in range(300):
+        index.add(f"chicken a{i:03d}", count=0)
+    index.add("chicken tikka masala", count=1)
+    index.add("chicken tikka masala", count=999)
+    names = [s["dish_name"] for s in index.suggest("chicken", 5)]
+    assert names[0] == "chicken tikka masala"
+    assert index.suggest("chi", 1)[0]["dish_name"] == "chicken tikka masala"
+
+
+def test_common_prefixes_stay_well_under_a_millisecond():
+    rng = random.Random(1)
+    words = ["chicken", "beef", "rice", "salad", "soup", "curry", "cheese", "sauce"]
+    words += ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=6)) for _ in range(2000)]
+    index = SuggestIndex()
+    while len(index) < 20_000:
+        index.add(" ".join(rng.choices(words, k=rng.randint(1, 4))), count=rng.randint(0, 100))
+    for query in ("c", "s", "ch"):
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(20):
+                index.suggest(query)
+            best = min(best, (time.perf_counter() - start) / 20)
+        assert best < 0.0005, (query, best)
+
+
+class FakeUSDA:
+    async def search_records(self, query, page_size=10):
+        from app.services.nutrition import FoodRecord
+        return [FoodRecord(fdc_id=1, name="Pasta, cooked", data_type="Survey (FNDDS)", energy=158.0)]
+
+
+@pytest.mark.asyncio
+async def test_resolved_dishes_feed_the_suggest_endpoint():
+    index = SuggestIndex()
+    await CaloriesService(FakeUSDA(), suggestions=index).get_calories("Pasta Carbonara", 1)
+    assert index.suggest("pasta")[0]["matched_item"] == "Pasta, cooked"
+
+    CaloriesService.suggestions.add("pasta carbonara", "Pasta, cooked")
+    async with AsyncClient(app=create_app(), base_url="http://test") as ac:
+        body = (await ac.get("/dishes/suggest", params={"q": "Pasta c"})).json()
+    assert "pasta carbonara" in [s["dish_name"] for s in body["suggestions"]]
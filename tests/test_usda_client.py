@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from app.services.calories_service import (
+    INTERACTIVE, REFRESH, WARMUP, CaloriesService, UpstreamUnavailable, USDAClient, USDAScheduler,
+)
+from app.utils.cache import InMemoryCache, RecordCache
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.metrics import RATE_LIMIT_DECISIONS
+
+PAYLOAD = {"foods": [{
+    "description": "Apples, raw",
+    "dataType": "Foundation",
+    "foodNutrients": [{"nutrientNumber": "208", "nutrientName": "Energy", "value": 52, "unitName": "KCAL"}],
+}]}
+
+
+def client_for(statuses):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        if status == 200:
+            return httpx.Response(200, json=PAYLOAD)
+        return httpx.Response(status, headers={"Retry-After": "0"})
+
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return http, calls
+
+
+@pytest.mark.asyncio
+async def test_retries_honor_retry_after_then_succeed():
+    http, calls = client_for([503, 429, 200])
+    usda = USDAClient("key", http_client=http)
+    [record] = await usda.search_records("apple")
+    assert record.name == "Apples, raw"
+    assert len(calls) == 3
+    assert usda.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_breaker_fails_fast_and_stale_records_are_served():
+    http, calls = client_for([200, 500])
+    usda = USDAClient("key", http_client=http, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    records = RecordCache(InMemoryCache(), ttl=60, stale_ttl=3600)
+    service = CaloriesService(usda, records=records)
+    await service.get_calories("apple", 1)
+
+    # age the cached record past its fresh TTL
+    record = await records.get("apple")
+    await records.set("apple", record, stored_at=time.time() - 120)
+
+    res = await service.get_calories("apple", 2)
+    assert res["total_calories"] == 104
+    assert usda.breaker.state == CircuitBreaker.OPEN
+
+    before = len(calls)
+    with pytest.raises(UpstreamUnavailable):
+        await usda.search_records("banana")
+    assert len(calls) == before
+
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_interactive_before_background_when_quota_runs_out():
+    http, _ = client_for([200])
+    scheduler = USDAScheduler(USDAClient("key", http_client=http), InMemoryCache(), quota=5, window=1)
+    for _ in range(5):
+        await scheduler.acquire(INTERACTIVE)
+    order = []
+
+    async def wait(priority):
+        await scheduler.acquire(priority)
+        order.append(priority)
+
+    tasks = [asyncio.ensure_future(wait(p)) for p in (WARMUP, REFRESH, INTERACTIVE)]
+    await asyncio.gather(*tasks)
+    assert order == [INTERACTIVE, REFRESH, WARMUP]
+    assert scheduler.stats()["granted_interactive"] == 6
+
+    quick = USDAScheduler(USDAClient("key", http_client=http), InMemoryCache(), quota=1, window=3600, max_wait=0.05)
+    await quick.search_records("apple")
+    with pytest.raises(UpstreamUnavailable) as exc:
+        await quick.search_records("apple")
+    assert exc.value.retry_after > 60
+    assert quick.stats()["quota_remaining"] == 0
+    await scheduler.close()
+    await quick.close()
+
+
+@pytest.mark.asyncio
+async def test_refreshes_fetch_remembered_foods_in_one_batch():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.method == "POST":
+            ids = json.loads(request.content)["fdcIds"]
+            return httpx.Response(200, json=[
+                {"fdcId": i, "description": f"Food {i}", "dataType": "Foundation",
+                 "foodNutrients": [
+                     {"number": "958", "name": "Energy (Atwater Specific Factors)", "amount": 49 + i, "unitName": "kcal"},
+                     {"number": "208", "name": "Energy", "amount": 50 + i, "unitName": "kcal"},
+                 ][:i]}
+                for i in ids
+            ])
+        name = request.url.params["query"]
+        fdc_id = {"apple": 1, "pear": 2}[name]
+        return httpx.Response(200, json={"foods": [{
+            "fdcId": fdc_id, "description": name.title(), "dataType": "Foundation",
+            "foodNutrients": [{"nutrientNumber": "208", "nutrientName": "Energy", "value": 40, "unitName": "KCAL"}],
+        }]})
+
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    scheduler = USDAScheduler(USDAClient("key", http_client=http), InMemoryCache(), quota=100, window=3600)
+    records = RecordCache(InMemoryCache())
+    service = CaloriesService(scheduler, records=records)
+    for dish in ("apple", "pear"):
+        await service.lookup(dish)
+    assert scheduler.fdc_ids.get("apple") == 1
+
+    await asyncio.gather(service._refresh("apple", "apple"), service._refresh("pear", "pear"))
+    assert [r.method for r in requests] == ["GET", "GET", "POST"]
+    body = json.loads(requests[-1].content)
+    assert body["fdcIds"] == [1, 2] and {957, 958} <= set(body["nutrients"])
+    # Atwater energy when that is all a food has, 208 when it has both
+    assert (await records.get("apple")).energy == 50
+    assert (await records.get("pear")).energy == 52
+    stats = scheduler.stats()
+    assert stats["batches"] == 1 and stats["granted_refresh"] == 1 and stats["granted_interactive"] == 2
+    await scheduler.close()
+
+
+@pytest.mark.asyncio
+async def test_every_attempt_spends_quota():
+    http, calls = client_for([503, 200])
+    scheduler = USDAScheduler(USDAClient("key", http_client=http), InMemoryCache(), quota=10, window=3600)
+    client_decisions = RATE_LIMIT_DECISIONS.value("rate_limit", "allowed")
+    await scheduler.search_records("apple")
+    assert len(calls) == 2
+    stats = scheduler.stats()
+    assert stats["granted_interactive"] == 2 and stats["quota_remaining"] == 8
+    # quota checks are not client rate-limit decisions
+    assert RATE_LIMIT_DECISIONS.value("rate_limit", "allowed") == client_decisions
+    assert RATE_LIMIT_DECISIONS.value("usda_quota", "allowed") >= 2
+    await scheduler.close()
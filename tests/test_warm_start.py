@@ -0,0 +1,40 @@
+import pytest
+from app.services.nutrition import FoodRecord
+from app.services import warm_start
+from app.utils.cache import InMemoryCache, RecordCache
+from app.utils.heavy_hitters import SpaceSaving
+
+
+def test_space_saving_keeps_heavy_hitters():
+    hot = SpaceSaving(capacity=10)
+    for _ in range(50):
+        hot.add("pasta")
+    for _ in range(20):
+        hot.add("rice")
+    for i in range(100):
+        hot.add(f"rare {i}")
+    assert len(hot) == 10
+    assert [key for key, _ in hot.top(2)] == ["pasta", "rice"]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_roundtrip_restores_records_without_lookups(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    pasta = FoodRecord(fdc_id=1, name="Pasta, cooked", data_type="Survey (FNDDS)", energy=158.0)
+    records = RecordCache(InMemoryCache(), l1_size=16)
+    await records.set("pasta", pasta)
+    hot = SpaceSaving(10)
+    hot.add("pasta", 5)
+    hot.add("uncached dish", 3)
+    assert await warm_start.save_snapshot(path, records, limit=10, hot=hot) == 1
+
+    fresh = RecordCache(InMemoryCache(), l1_size=16)
+    fresh_hot = SpaceSaving(10)
+    stats = await warm_start.warm(None, None, fresh, warm_start.load_snapshot(path), [], rate=0, hot=fresh_hot)
+    assert stats == {"restored": 1, "resolved": 0, "failed": 0}
+    assert await fresh.get("pasta") == pasta
+    assert fresh_hot.top(1) == [("pasta", 5)]
+
+
+def test_missing_snapshot_is_empty(tmp_path):
+    assert warm_start.load_snapshot(str(tmp_path / "nope.json")) == []